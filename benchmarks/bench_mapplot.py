@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+# Benchmarks of mapplot
+# Wall time (minimum and median of the repeats) and peak memory (tracemalloc) are measured for each scenario.
+#
+# Usage:
+#   python benchmarks/bench_mapplot.py                   # all scenarios
+#   python benchmarks/bench_mapplot.py --quick           # 2.5 and 1.0 degree grids only
+#   python benchmarks/bench_mapplot.py --filter display/shaded --json result.json
+#
+# Compare the JSON outputs before and after an upgrade of cartopy/matplotlib or a change of mapplot.
+
+import argparse
+import concurrent.futures
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import cartopy
+import cartopy.crs       as ccrs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mapplot as mp_module
+from mapplot import mapplot
+
+
+GRIDS       = [2.5, 1.0, 0.5, 0.25, 0.1]
+QUICK_GRIDS = [2.5, 1.0]
+RESOLUTIONS = ['low', 'medium', 'high']
+METHODS     = ['contour', 'shaded', 'hatches', 'vector']
+EXTENTS     = {'global'  : {},
+               'regional': {'lonlim': [120., 150.], 'latlim': [20., 50.]},
+              }
+PROJECTIONS = {'PlateCarree': lambda: None,
+               'Robinson'   : lambda: ccrs.Robinson(central_longitude=180.),
+              }
+LEVELS      = np.linspace(-1., 1., 11)
+FIGSIZE     = (8, 5)
+
+
+# Registered scenarios : list of (name, setup, run)
+# setup() returns a dictionary passed to run(). If it has 'fig', the figure is closed after run().
+# run() may return the size of its output in bytes, which is reported with the time.
+SCENARIOS = []
+
+
+def add(name, setup, run):
+    SCENARIOS.append((name, setup, run))
+
+
+# Synthetic fields on a global grid of dlon degrees : cached for each grid
+_FIELDS = {}
+def fields(dlon):
+    if (dlon in _FIELDS):
+        return _FIELDS[dlon]
+
+    lon  = np.arange(  0., 360., dlon)
+    lat  = np.arange(-90., 90.+dlon*0.5, dlon)
+    x, y = np.meshgrid(np.deg2rad(lon), np.deg2rad(lat))
+    data = np.cos(y) * np.sin(3.*x) + 0.3 * np.cos(5.*y) * np.cos(7.*x)
+    _FIELDS[dlon] = {'lon' : lon,
+                     'lat' : lat,
+                     'data': data,
+                     'mask': (data > 0.3),
+                     'u'   : np.cos(y) * np.cos(2.*x),
+                     'v'   : np.sin(y) * np.sin(2.*x),
+                    }
+    return _FIELDS[dlon]
+
+
+def grid_name(dlon):
+    return f'{dlon:g}deg'
+
+
+def new_mapplot(dlon, extent='global', projection='PlateCarree', **kwargs):
+    field = fields(dlon)
+    fig   = plt.figure(figsize=FIGSIZE)
+    args  = dict(EXTENTS[extent])
+    args.update(kwargs)
+    proj  = PROJECTIONS[projection]()
+    if (proj is not None):
+        args['projection'] = proj
+    mp = mapplot(fig, [1,1,1], field['lon'], field['lat'], **args)
+    return fig, mp
+
+
+def display(mp, method, field):
+    if (method == 'contour'):
+        mp.display(field['data'], levels=LEVELS)
+    elif (method == 'shaded'):
+        mp.display(field['data'], levels=LEVELS)
+    elif (method == 'hatches'):
+        mp.display(field['mask'])
+    elif (method == 'vector'):
+        mp.display(field['u'], field['v'], cmap=None)
+
+
+# mapplot() at each resolution of the coastlines
+# "cold" clears the coastline cache first, "warm" reuses the coastlines of the previous instance
+def register_init():
+    for resolution in RESOLUTIONS:
+        for state in ['cold', 'warm']:
+            def setup(resolution=resolution, state=state):
+                if (state == 'cold'):
+                    mp_module.set_coastline_cache()
+                else:
+                    fig, mp = new_mapplot(2.5, resolution=resolution)
+                    plt.close(fig)
+                return {'fig': plt.figure(figsize=FIGSIZE), 'resolution': resolution}
+
+            def run(st):
+                field = fields(2.5)
+                mapplot(st['fig'], [1,1,1], field['lon'], field['lat'], resolution=st['resolution'])
+
+            add(f'init/{resolution}/{state}', setup, run)
+
+
+# display() of each method on each grid, extent, and projection
+# The contour cache is disabled (the default), so each run contours the field (see register_contour_cache())
+def register_display(grids):
+    for method in METHODS:
+        for dlon in grids:
+            for extent in EXTENTS:
+                for projection in PROJECTIONS:
+                    def setup(method=method, dlon=dlon, extent=extent, projection=projection):
+                        mp_module.set_contour_cache(maxbytes=0)
+                        fig, mp = new_mapplot(dlon, extent, projection)
+                        mp.gxout(method)
+                        return {'fig': fig, 'mp': mp, 'method': method, 'field': fields(dlon)}
+
+                    def run(st):
+                        display(st['mp'], st['method'], st['field'])
+
+                    add(f'display/{method}/{grid_name(dlon)}/{extent}/{projection}', setup, run)
+
+
+# set_label() and set_cbar() on each projection
+# Gridlines and colorbars do most of their work when drawn, so the figure is drawn in run().
+# draw/<projection> is the time to draw the map only, to be subtracted from them.
+def register_decoration():
+    for projection in PROJECTIONS:
+        def setup_draw(projection=projection):
+            fig, mp = new_mapplot(1.0, 'global', projection)
+            return {'fig': fig, 'mp': mp}
+
+        def run_draw(st):
+            st['fig'].canvas.draw()
+
+        def run_label(st):
+            st['mp'].set_label()
+            st['fig'].canvas.draw()
+
+        def setup_cbar(projection=projection):
+            fig, mp = new_mapplot(1.0, 'global', projection)
+            mp.gxout('shaded')
+            display(mp, 'shaded', fields(1.0))
+            return {'fig': fig, 'mp': mp}
+
+        def run_cbar(st):
+            st['mp'].set_cbar()
+            st['fig'].canvas.draw()
+
+        # New data of the shaded plot with set_label() and set_cbar() : display() and a full draw, or update() by blitting
+        def setup_replace(projection=projection, blit=False):
+            fig, mp = new_mapplot(1.0, 'global', projection)
+            mp.gxout('shaded')
+            display(mp, 'shaded', fields(1.0))
+            mp.set_label()
+            mp.set_cbar()
+            fig.canvas.draw()
+            if (blit):
+                mp.update(fields(1.0)['data'], levels=LEVELS)
+            return {'fig': fig, 'mp': mp, 'data': np.roll(fields(1.0)['data'], 10, axis=1)}
+
+        def run_redraw(st):
+            st['mp'].shade.remove()
+            st['mp'].display(st['data'], levels=LEVELS)
+            st['fig'].canvas.draw()
+
+        def run_update(st):
+            st['mp'].update(st['data'], levels=LEVELS)
+
+        add(f'draw/{projection}'     , setup_draw, run_draw )
+        add(f'set_label/{projection}', setup_draw, run_label)
+        add(f'set_cbar/{projection}' , setup_cbar, run_cbar )
+        add(f'replace/display/{projection}', setup_replace, run_redraw)
+        add(f'replace/update/{projection}' , lambda projection=projection: setup_replace(projection, blit=True), run_update)
+
+
+# mapplot(), display(), set_label(), set_cbar(), and savefig() to PNG/PDF
+def register_savefig(grids):
+    for fmt in ['png', 'pdf']:
+        for dlon in grids:
+            for extent in EXTENTS:
+                for projection in PROJECTIONS:
+                    def setup(fmt=fmt, dlon=dlon, extent=extent, projection=projection):
+                        return {'fmt': fmt, 'dlon': dlon, 'extent': extent, 'projection': projection}
+
+                    def run(st):
+                        fig, mp = new_mapplot(st['dlon'], st['extent'], st['projection'])
+                        mp.gxout('shaded')
+                        display(mp, 'shaded', fields(st['dlon']))
+                        mp.set_label()
+                        mp.set_cbar()
+                        fig.savefig(io.BytesIO(), format=st['fmt'])
+                        plt.close(fig)
+
+                    add(f'savefig/{fmt}/{grid_name(dlon)}/{extent}/{projection}', setup, run)
+
+
+# Small multiples of 1, 4, and 12 panels drawn with set_label() and colorbars
+# "independent" builds a mapplot for each panel, "panels" uses mappanels sharing the grid, projection, and caches
+PANELS = {1: (1, 1), 4: (2, 2), 12: (3, 4)}
+def register_panels():
+    for count, (nrows, ncols) in PANELS.items():
+        for layout in ['independent', 'panels']:
+            for projection in PROJECTIONS:
+                def setup(count=count, nrows=nrows, ncols=ncols, layout=layout, projection=projection):
+                    field = fields(1.0)
+                    return {'stack': np.stack([np.roll(field['data'], 10*i, axis=1) for i in range(count)]),
+                            'count': count, 'nrows': nrows, 'ncols': ncols, 'layout': layout, 'projection': projection}
+
+                def run(st):
+                    field = fields(1.0)
+                    fig   = plt.figure(figsize=(12, 8))
+                    args  = {}
+                    proj  = PROJECTIONS[st['projection']]()
+                    if (proj is not None):
+                        args['projection'] = proj
+                    if (st['layout'] == 'panels'):
+                        panels = mp_module.mappanels(fig, st['nrows'], st['ncols'], field['lon'], field['lat'], **args)
+                        panels.gxout('shaded')
+                        panels.display(st['stack'], levels=LEVELS)
+                        panels.set_label()
+                        panels.set_cbar()
+                    else:
+                        for i in range(st['count']):
+                            mp = mapplot(fig, [st['nrows'], st['ncols'], i+1], field['lon'], field['lat'], **args)
+                            mp.gxout('shaded')
+                            mp.display(st['stack'][i], levels=LEVELS)
+                            mp.set_label()
+                            mp.set_cbar()
+                    fig.savefig(io.BytesIO(), format='png')
+                    plt.close(fig)
+
+                add(f'panels/{count}/{layout}/{projection}', setup, run)
+
+
+# 8 maps rendered to PNG bytes by 1 or 4 threads : each thread builds its own mapplot on a Figure without pyplot
+THREADS = [1, 4]
+def register_threads():
+    for workers in THREADS:
+        for projection in PROJECTIONS:
+            def setup(workers=workers, projection=projection):
+                mp_module.set_thread_rendering()
+                return {'workers': workers, 'projection': projection}
+
+            def job(i, projection):
+                field = fields(1.0)
+                args  = {}
+                proj  = PROJECTIONS[projection]()
+                if (proj is not None):
+                    args['projection'] = proj
+                mp = mapplot(None, [1,1,1], field['lon'], field['lat'], **args)
+                mp.gxout('shaded')
+                mp.display(np.roll(field['data'], 10*i, axis=1), levels=LEVELS)
+                mp.set_label()
+                mp.set_cbar()
+                return mp.to_bytes('png')
+
+            def run(st):
+                with concurrent.futures.ThreadPoolExecutor(st['workers']) as executor:
+                    list(executor.map(job, range(8), [st['projection']]*8))
+
+            add(f'threads/{workers}/{projection}', setup, run)
+
+
+# Web Mercator tiles of zoom 0 to 3 (85 tiles) from the 1.0 degree grid
+# "cold" starts from an empty tile cache, "unchanged" renders the same field again
+def register_tiles():
+    for state in ['cold', 'unchanged']:
+        def setup(state=state):
+            field = fields(1.0)
+            mp    = mapplot(None, [1,1,1], field['lon'], field['lat'], projection=ccrs.Mercator.GOOGLE, latlim=[-85., 85.], coastline=False)
+            mp.gxout('shaded')
+            directory = tempfile.mkdtemp(prefix='bench_tiles_')
+            if (state == 'unchanged'):
+                mp.render_tiles(directory, field['data'], zooms=range(0, 4), levels=LEVELS)
+            return {'mp': mp, 'directory': directory}
+
+        def run(st):
+            try:
+                st['mp'].render_tiles(st['directory'], fields(1.0)['data'], zooms=range(0, 4), levels=LEVELS)
+            finally:
+                shutil.rmtree(st['directory'], ignore_errors=True)
+
+        add(f'tiles/{state}', setup, run)
+
+
+# Shaded plot of 20000 scattered points and of the 1.0 degree grid given as a 2D curvilinear grid
+# "cold" clears the triangulation cache first, "cached" reuses the triangulation of the previous instance
+def register_unstructured():
+    rng    = np.random.default_rng(0)
+    field  = fields(1.0)
+    mglon, mglat = np.meshgrid(field['lon'], field['lat'])
+    points = {'lon': rng.uniform(0., 360., 20000), 'lat': np.rad2deg(np.arcsin(rng.uniform(-1., 1., 20000)))}
+    points['data'] = np.cos(np.deg2rad(points['lat'])) * np.sin(3.*np.deg2rad(points['lon']))
+    grids  = {'points'     : (points['lon'], points['lat'], points['data'], 'points'),
+              'curvilinear': (mglon, mglat, field['data'], 'curvilinear'),
+             }
+    for name, (lon, lat, data, grid) in grids.items():
+        for projection in PROJECTIONS:
+            for state in ['cold', 'cached']:
+                def setup(lon=lon, lat=lat, grid=grid, projection=projection, state=state):
+                    if (state == 'cold'):
+                        mp_module.set_triangulation_cache()
+                    fig  = plt.figure(figsize=FIGSIZE)
+                    proj = PROJECTIONS[projection]()
+                    args = {} if (proj is None) else {'projection': proj}
+                    mp   = mapplot(fig, [1,1,1], lon, lat, grid=grid, **args)
+                    mp.gxout('shaded')
+                    return {'fig': fig, 'mp': mp}
+
+                def run(st, data=data):
+                    st['mp'].display(data, levels=LEVELS)
+                    st['fig'].savefig(io.BytesIO(), format='png')
+
+                add(f'unstructured/{name}/{state}/{projection}', setup, run)
+
+
+# Shaded plot over the ocean only on each grid
+# "cold" clears the mask cache first, "cached" reuses the land mask of the previous instance
+def register_mask(grids):
+    for dlon in grids:
+        for state in ['cold', 'cached']:
+            def setup(dlon=dlon, state=state):
+                if (state == 'cold'):
+                    mp_module.set_mask_cache()
+                fig, mp = new_mapplot(dlon)
+                mp.gxout('shaded')
+                return {'fig': fig, 'mp': mp}
+
+            def run(st, dlon=dlon):
+                st['mp'].display(fields(dlon)['data'], levels=LEVELS, mask='ocean')
+
+            add(f'mask/{state}/{grid_name(dlon)}', setup, run)
+
+
+# Shaded, hatches, and contour of the 0.25 degree grid saved to PDF and SVG
+# "vector" is the default output, "rasterized" rasterizes shaded and hatches at 150 dpi (to_bytes()),
+# "simplified" simplifies the contours by 0.3 points, and "both" does both. The size of the file is reported.
+OUTPUT_MODES = {'vector'    : None,
+                'rasterized': {'dpi': 150},
+                'simplified': {'rasterize': None, 'simplify': 0.3},
+                'both'      : {'dpi': 150, 'simplify': 0.3},
+               }
+def register_vector_output():
+    for fmt in ['pdf', 'svg']:
+        for mode, options in OUTPUT_MODES.items():
+            for projection in PROJECTIONS:
+                def setup(options=options, projection=projection):
+                    field   = fields(0.25)
+                    fig, mp = new_mapplot(0.25, projection=projection)
+                    if (options is not None):
+                        mp.set_vector_output(**options)
+                    mp.gxout('shaded')
+                    display(mp, 'shaded', field)
+                    mp.gxout('hatches')
+                    display(mp, 'hatches', field)
+                    mp.gxout('contour')
+                    mp.display(field['data'], levels=LEVELS, colors='black')
+                    mp.set_label()
+                    mp.set_cbar()
+                    return {'fig': fig, 'mp': mp}
+
+                def run(st, fmt=fmt):
+                    return len(st['mp'].to_bytes(fmt))
+
+                add(f'vector_output/{fmt}/{mode}/{projection}', setup, run)
+
+
+# Time series of 240 steps on the 1.0 degree grid in a float32 memmap (60 MiB) : created once
+_SERIES = {}
+def series():
+    if ('data' in _SERIES):
+        return _SERIES['data']
+
+    field = fields(1.0)
+    _SERIES['directory'] = tempfile.TemporaryDirectory(prefix='bench_reduce_')
+    fname = os.path.join(_SERIES['directory'].name, 'series.dat')
+    data  = np.memmap(fname, dtype=np.float32, mode='w+', shape=(240,)+field['data'].shape)
+    for t in range(data.shape[0]):
+        data[t] = field['data'] * np.cos(2.*np.pi*t/24.) + 0.1 * np.sin(t)
+    data.flush()
+    _SERIES['data'] = np.memmap(fname, dtype=np.float32, mode='r', shape=data.shape)
+    return _SERIES['data']
+
+
+# Mean and 0.9 quantile over time of the memmap series, global and regional
+# "loaded" reads the whole series and reduces it with numpy before display(), "streaming" uses display(reduce=...)
+def register_reduce():
+    for op in ['mean', 'quantile']:
+        for extent in EXTENTS:
+            for how in ['loaded', 'streaming']:
+                def setup(extent=extent):
+                    series()
+                    fig, mp = new_mapplot(1.0, extent=extent)
+                    mp.gxout('shaded')
+                    return {'fig': fig, 'mp': mp}
+
+                def run(st, op=op, how=how):
+                    data = series()
+                    if (how == 'streaming'):
+                        st['mp'].display(data, levels=LEVELS, reduce={'op': op, 'q': 0.9})
+                    elif (op == 'mean'):
+                        st['mp'].display(np.asarray(data, dtype=np.float64).mean(axis=0), levels=LEVELS)
+                    else:
+                        st['mp'].display(np.quantile(np.asarray(data, dtype=np.float64), 0.9, axis=0), levels=LEVELS)
+
+                add(f'reduce/{op}/{how}/{extent}', setup, run)
+
+
+# display() of contour and shaded with the contour cache enabled
+# "cold" clears the cache first (a miss : contouring and hashing), "warm" plots the same field on another instance first (a hit)
+# Registered last : the cache is disabled again by the setup of the other display scenarios only
+def register_contour_cache(grids):
+    for method in ['contour', 'shaded']:
+        for dlon in grids:
+            for projection in PROJECTIONS:
+                for state in ['cold', 'warm']:
+                    def setup(method=method, dlon=dlon, projection=projection, state=state):
+                        mp_module.set_contour_cache()
+                        if (state == 'warm'):
+                            fig, mp = new_mapplot(dlon, 'global', projection)
+                            mp.gxout(method)
+                            display(mp, method, fields(dlon))
+                            plt.close(fig)
+                        fig, mp = new_mapplot(dlon, 'global', projection)
+                        mp.gxout(method)
+                        return {'fig': fig, 'mp': mp, 'method': method, 'field': fields(dlon)}
+
+                    def run(st):
+                        display(st['mp'], st['method'], st['field'])
+
+                    add(f'contour_cache/{method}/{grid_name(dlon)}/{projection}/{state}', setup, run)
+
+
+def register(grids):
+    register_init()
+    register_display(grids)
+    register_decoration()
+    register_savefig(grids)
+    register_panels()
+    register_threads()
+    register_tiles()
+    register_unstructured()
+    register_mask(grids)
+    register_vector_output()
+    register_reduce()
+    register_contour_cache(grids)
+
+
+# Run setup() and run() once : seconds of run(), peak memory (bytes) if trace=True, and the output size returned by run()
+def measure_once(setup, run, trace=False):
+    if (trace):
+        tracemalloc.start()
+    try:
+        state = setup()
+        if (trace):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        size  = run(state)
+        seconds = time.perf_counter() - start
+        peak    = tracemalloc.get_traced_memory()[1] - base if trace else None
+    finally:
+        if (trace):
+            tracemalloc.stop()
+    if ('fig' in state):
+        plt.close(state['fig'])
+
+    return seconds, peak, size
+
+
+# One untimed warm-up, repeat timed runs, and one run with tracemalloc
+def measure(setup, run, repeat):
+    size  = measure_once(setup, run)[2]
+    times = [measure_once(setup, run)[0] for i in range(repeat)]
+    peak  = measure_once(setup, run, trace=True)[1]
+    return {'min'      : min(times),
+            'median'   : statistics.median(times),
+            'repeat'   : repeat,
+            'peak_mib' : peak / 2.**20,
+            'size_kib' : size / 2.**10 if (size is not None) else None,
+           }
+
+
+def environment():
+    return {'python'    : platform.python_version(),
+            'numpy'     : np.__version__,
+            'matplotlib': matplotlib.__version__,
+            'cartopy'   : cartopy.__version__,
+            'machine'   : platform.machine(),
+            'platform'  : platform.platform(),
+           }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of mapplot')
+    parser.add_argument('--quick' , action='store_true', help='use 2.5 and 1.0 degree grids only')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs (default: 3)')
+    parser.add_argument('--filter', action='append', default=[], help='run scenarios whose name contains this string (repeatable)')
+    parser.add_argument('--list'  , action='store_true', help='list the scenarios and exit')
+    parser.add_argument('--json'  , default=None, help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    register(QUICK_GRIDS if args.quick else GRIDS)
+    selected = [s for s in SCENARIOS if (not args.filter or any(f in s[0] for f in args.filter))]
+    if (args.list):
+        for name, setup, run in selected:
+            print(name)
+        return 0
+
+    env = environment()
+    print(' '.join(f'{key}={value}' for key, value in env.items()))
+    print(f'{"scenario":<48} {"min [s]":>9} {"median [s]":>11} {"peak [MiB]":>11} {"size [KiB]":>11}')
+    results = {}
+    for name, setup, run in selected:
+        result = measure(setup, run, args.repeat)
+        results[name] = result
+        size = f'{result["size_kib"]:11.0f}' if (result['size_kib'] is not None) else ''
+        print(f'{name:<48} {result["min"]:9.4f} {result["median"]:11.4f} {result["peak_mib"]:11.1f} {size}', flush=True)
+
+    if (args.json is not None):
+        with open(args.json, 'w') as f:
+            json.dump({'environment': env, 'results': results}, f, indent=1)
+
+    return 0
+
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -1,11 +1,48 @@
+import io
+import os
+import json
+import time
+import shutil
+import socket
+import stat
+import struct
+import hashlib
+import ipaddress
+import functools
+import contextlib
+import traceback
+import threading
+import tracemalloc
 import warnings
-import numpy             as np
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
-import cartopy.crs       as ccrs
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
-from cartopy.util       import add_cyclic_point
+import weakref
+import types
+import collections
+import collections.abc
+import concurrent.futures
+import numpy                  as np
+import matplotlib             as mpl
+import matplotlib.animation   as manimation
+import matplotlib.artist      as martist
+import matplotlib.colors      as mcolors
+import matplotlib.collections as mcollections
+import matplotlib.contour     as mcontour
+import matplotlib.image       as mimage
+import matplotlib.patheffects as mpatheffects
+import matplotlib.ticker      as mticker
+import matplotlib.tri         as mtri
+import cartopy
+import cartopy.crs            as ccrs
+import cartopy.feature        as cfeature
+import cartopy.trace          as ctrace
+import shapely
+from scipy import sparse
+from multiprocessing import shared_memory, resource_tracker
+from matplotlib.figure                 import Figure
+from matplotlib.path                   import Path
+from matplotlib.backends.backend_agg   import FigureCanvasAgg
+from cartopy.mpl.geoaxes               import InterProjectionTransform
+from cartopy.mpl.ticker                import LongitudeFormatter, LatitudeFormatter
+from cartopy.util                      import add_cyclic_point
 
 class mapplot:
 
@@ -17,7 +54,12 @@ class mapplot:
                     'projection': None,             # Graph Projection : assuming object
                     'resolution': 'medium',         # Map Resolution : high/h/10m, medium/m/50m, or low/l/110m
                     'central_longitude': None,      # Central longitude of map: range of longitude must not include this value
-                    'verbose'          : False,     # print setting information
+                    'verbose'          : False,     # print setting information and stage timings
+                    'profile'          : False,     # Record stage timings : True, or 'memory' to trace allocations
+                    'coord_dtype'      : 'float64', # dtype of the cached projected coordinates : float64 or float32
+                    'share'            : None,      # mapplot whose grid, projection, and window cache are shared
+                    'coastline'        : True,      # Draw coastlines
+                    'grid'             : None,      # Grid of lon and lat : "regular" (1D), "curvilinear" (2D), or "points" (1D point cloud)
                    }
         unknown = set(kwargs) - defaults.keys()
         if unknown:
@@ -26,12 +68,56 @@ class mapplot:
         args.update(kwargs)
         self.__kwargs = args            # Copy for future meintainances
 
+        # Wall time (and allocated bytes) of each stage : None unless profile or verbose
+        self.profiler = None
+        if (args['profile'] or args['verbose']):
+            self.profiler = _StageProfiler(memory=(args['profile'] == 'memory'), verbose=args['verbose'])
+
+        share = args['share']
+        if (share is not None):
+            if (not isinstance(share, mapplot)):
+                raise TypeError(f'Invalid share : {type(share).__name__}. Expected a mapplot instance')
+            if (not (np.array_equal(share.lon, lon) and np.array_equal(share.lat, lat))):
+                raise ValueError('mapplot given to "share" must have the same lon and lat')
+            if (args['projection'] is None):
+                args['projection'] = share.__proj
+
         self.lon = np.array(lon)
         self.lat = np.array(lat)
         self.lev = np.atleast_1d(np.array(args['lev'], dtype=float))
-
-        dummy, self.lon_cycle  = add_cyclic_point(self.lon, coord=self.lon)
-        self.mglon, self.mglat = np.meshgrid(self.lon_cycle, self.lat)
+        self.grid = self.__grid_type(args['grid'])
+
+        # Curvilinear grids and points are plotted on the triangulation of the points : no cyclic point
+        self.__unstructured = (self.grid != 'regular')
+        if (self.__unstructured):
+            self.lon_cycle   = None
+            self.__grid_key  = share.__grid_key if (share is not None) else _grid_key(self.lon, self.lat)
+            self.__point_lon = np.asarray(self.lon, dtype=np.float64).ravel()
+            self.__point_lat = np.asarray(self.lat, dtype=np.float64).ravel()
+        with self.__stage('init.cyclic_point'):
+            if (self.__unstructured):
+                pass
+            elif (share is None):
+                dummy, self.lon_cycle = add_cyclic_point(self.lon, coord=self.lon)
+            else:
+                self.lon_cycle = share.lon_cycle
+
+        self.__coord_dtype = np.dtype(args['coord_dtype'])
+        if (self.__coord_dtype != np.float64 and self.__coord_dtype != np.float32):
+            raise ValueError(f'Invalid coord_dtype : {args["coord_dtype"]}. Expected "float64" or "float32"')
+
+        # Data covering 360 degrees can be wrapped around at the seam of the longitude
+        self.__cyclic  = (not self.__unstructured) and bool(np.abs(self.lon_cycle[-1] - self.lon_cycle[0] - 360.) < 1.E-5)
+        # Wrap layout of the cyclic point : the first column is repeated at the end
+        self.__wrap    = np.append(np.arange(self.lon.size), 0)
+        self.__halo    = 2      # Number of grid points kept outside the plotted area
+        self.__windows = _LRUCache(32, maxbytes=512*2**20)  # Index windows of the plotted area and their projected meshes : cached for each extent
+        self.__shared  = False  # True if the window cache is shared with other panels
+        if (share is not None):
+            self.__windows = share.__windows    # Windows and their projected meshes are computed once for all sharing panels
+            self.__shared  = True
+            share.__shared = True
+        self.__buffers = {}     # Reusable arrays filled by the windowed data
 
         self.__proj            = args['projection']
         self.__crs             = None
@@ -48,8 +134,11 @@ class mapplot:
         self.__set_lat_core(args['latlim'])         # Set self.latlim
         self.set_lev(args['levlim'])    # Set self.levlim and self.levidx
 
-        self.__figureProjection()       # Set projection
+        with self.__stage('init.projection'):
+            self.__figureProjection()   # Set projection
         self.projection = self.__proj.__class__.__name__
+        # x depends on the longitude only and y on the latitude only : the projected meshes are kept as 1D coordinates
+        self.__separable = isinstance(self.__proj, (ccrs.PlateCarree, ccrs.Mercator, ccrs.Miller, ccrs.LambertCylindrical))
 
         self.method = 'contour'         # Default plot method as contour
 
@@ -84,36 +173,75 @@ class mapplot:
         if (not isValid):
             raise ValueError(f'Invalid posit : {posit}. Expected a 3-digit subplot code (e.g., 111) or a list [rows, cols, index] with 1 <= index <= rows*cols.')
 
+        # Figure without pyplot : drawn by its own Agg canvas
+        if (fig is None):
+            fig = Figure()
+            FigureCanvasAgg(fig)
+
         self.fig         = fig
-        self.ax          = self.fig.add_subplot(rows, lines, idx, projection=self.__proj)
+        with self.__stage('init.add_subplot'):
+            self.ax      = self.fig.add_subplot(rows, lines, idx, projection=self.__proj)
+        self.__profile_draw(self.ax, 'draw.axes')
         self.cont        = None     # None until contour plot
         self.shade       = None     # None until shade plot
         self.hatch       = None     # None until hatch plot
         self.vector      = None     # None until vector plot
+        self.raster      = None     # None until raster plot
         self.ccbar       = None     # Color Bar for contour
         self.scbar       = None     # Color Bar for shade
+        self.rcbar       = None     # Color Bar for raster
         self.vector_repr = None     # Representative value of vector
+        self.__blit      = None     # Background and animated artists of update() : None until update()
+        self.__output    = {'rasterize': (), 'dpi': None, 'simplify': None}   # Output-size mode : see set_vector_output()
 
-        resolution = args['resolution'].lower()
-        if (resolution == 'high' or resolution == 'h' or resolution == '10m'):
-            self.resolution = 'high'
-            cl_resolution   = '10m'
-        elif (resolution == 'medium' or resolution == 'm' or resolution == '50m'):
-            self.resolution = 'medium'
-            cl_resolution   = '50m'
-        elif (resolution == 'low' or resolution == 'l' or resolution == '110m'):
-            self.resolution = 'low'
-            cl_resolution   = '110m'
-        else:
-            raise ValueError(f'Invalid map resolution : {resolution}\n'
-                             'Use one of {"high", "h", "10m", "medium", "m", "50m", "low", "l", "110m"}'
-                            )
-        self.ax.coastlines(resolution=cl_resolution, linewidth=0.5)
+        self.resolution, self.__cl_resolution = _map_resolution(args['resolution'])
+        self.__coastline = None     # Coastlines are drawn by set_extent()
+        self.__coastline_on = bool(args['coastline'])
 
         self.gridlines = None
+        self.__gridline_lines = None    # Meridians and parallels drawn instead of the gridliner by shared panels
         self.set_extent()
 
 
+    # Meshes of the entire grid (including the cyclic point) : read-only views of lon_cycle and lat
+    # Coordinates of the points as given for curvilinear grids and points
+    @property
+    def mglon(self):
+        if (self.__unstructured):
+            return self.lon
+        return self.__mesh(self.lon_cycle, self.lat)[0]
+
+
+    @property
+    def mglat(self):
+        if (self.__unstructured):
+            return self.lat
+        return self.__mesh(self.lon_cycle, self.lat)[1]
+
+
+    # Grid type from the "grid" keyword and the shapes of lon and lat
+    def __grid_type(self, grid):
+        if (grid is None):
+            grid = 'curvilinear' if (self.lon.ndim == 2) else 'regular'
+
+        grid = grid.lower()
+        if (grid == 'regular'):
+            if (self.lon.ndim != 1 or self.lat.ndim != 1):
+                raise ValueError(f'Invalid lon and lat for grid="regular" : 1D arrays are expected, got {self.lon.shape} and {self.lat.shape}')
+        elif (grid == 'curvilinear'):
+            if (self.lon.ndim != 2 or self.lon.shape != self.lat.shape):
+                raise ValueError(f'Invalid lon and lat for grid="curvilinear" : 2D arrays of the same shape are expected, got {self.lon.shape} and {self.lat.shape}')
+        elif (grid == 'points'):
+            if (self.lon.ndim != 1 or self.lon.shape != self.lat.shape):
+                raise ValueError(f'Invalid lon and lat for grid="points" : 1D arrays of the same size are expected, got {self.lon.shape} and {self.lat.shape}')
+        else:
+            raise ValueError(f'Invalid grid : {grid}. Expected "regular", "curvilinear", or "points"')
+        if (grid != 'regular' and np.count_nonzero(np.isfinite(self.lon) & np.isfinite(self.lat)) < 3):
+            raise ValueError('At least 3 points with finite lon and lat are needed to triangulate the grid')
+
+        return grid
+
+
     def set_lon(self, lonlim=None):
         self.__set_lon_core(lonlim)
         self.__set_lon_check()
@@ -135,10 +263,21 @@ class mapplot:
 
 
     def set_extent(self):
-        self.ax.set_extent(self.lonlim + self.latlim, crs=self.__crs)
+        with self.__stage('set_extent'):
+            self.ax.set_extent(self.lonlim + self.latlim, crs=self.__crs)
+            self.__set_coastlines()
+        self.__blit_reset()
 
 
     def set_label(self, x=None, y=None, fontsize=10, fontcolor='black', grid=True, linewidth=0.7, linestyle=':', linecolor='grey', alpha=0.7):
+        with self.__stage('set_label'):
+            self.__set_label(x, y, fontsize, fontcolor, grid, linewidth, linestyle, linecolor, alpha)
+        # Labels are placed when the gridlines are drawn
+        self.__profile_draw(self.gridlines, 'draw.gridlines')
+        self.__blit_reset()
+
+
+    def __set_label(self, x, y, fontsize, fontcolor, grid, linewidth, linestyle, linecolor, alpha):
         # Format of tick labels and grid lines
         self.gridlines = self.ax.gridlines(crs        =self.__crs          ,
                                            linewidth  =linewidth           ,
@@ -151,6 +290,8 @@ class mapplot:
                                           )
                                            #x_inline   =True                ,
                                            #y_inline   =True                ,
+        x_cp = None     # Default locators if omitted
+        y_cp = None
         if (x is not None):
             x_cp = x.astype(np.float64)
             x_cp = x_cp % 360.
@@ -180,11 +321,82 @@ class mapplot:
         self.gridlines.top_labels   = False
         self.gridlines.right_labels = False
 
+        if (self.__gridline_lines is not None):
+            self.__gridline_lines.remove()
+            self.__gridline_lines = None
+        # Panels sharing the window cache draw the lines projected once for all of them
+        if (self.__shared and grid):
+            self.__set_gridline_lines()
+
+
+    # Draw the meridians and parallels of the gridliner as a collection of projected lines
+    # The gridliner only places the labels at the same ticks
+    def __set_gridline_lines(self):
+        style = self.gridlines.collection_kwargs
+        segments, lon_ticks, lat_ticks = self.__gridline_segments(self.gridlines.xlocator, self.gridlines.ylocator)
+        self.gridlines.xlocator = mticker.FixedLocator(lon_ticks)
+        self.gridlines.ylocator = mticker.FixedLocator(lat_ticks)
+        self.gridlines.xlines   = False
+        self.gridlines.ylines   = False
+        lines = mcollections.LineCollection(segments                     ,
+                                            colors    =style['color']    ,
+                                            linewidths=style['linewidth'],
+                                            linestyles=style['linestyle'],
+                                            alpha     =style['alpha']    ,
+                                            transform =self.__proj       ,
+                                            clip_path =self.ax.patch     ,
+                                            zorder    =self.gridlines.get_zorder(),
+                                           )
+        self.__gridline_lines = self.ax.add_collection(lines, autolim=False)
+
+
+    # Meridians and parallels in the coordinate of the projection : projected once and cached in the window
+    # Returns the line vertices, and the longitudes (-180 to 180) and latitudes of the lines
+    def __gridline_segments(self, xlocator, ylocator):
+        window = self.__get_window()
+        lmin, lmax, smin, smax = window['bounds']
+        smin = max(smin, -90.)
+        smax = min(smax,  90.)
+
+        # Longitudes relative to the central longitude, where the visible range does not cross the seam
+        clon = self.central_longitude
+        x0   = -180.
+        x1   =  180.
+        if (lmax - lmin < 360.):
+            mid = ((lmin + lmax) * 0.5 - clon + 180.) % 360. - 180.
+            x0  = max(mid - (lmax - lmin) * 0.5, -180.)
+            x1  = min(mid + (lmax - lmin) * 0.5,  180.)
+        ticks = (np.asarray(xlocator.tick_values(lmin, lmax), dtype=np.float64) - clon + 180.) % 360. - 180.
+        ticks = np.unique(np.round(ticks[(ticks >= x0-1.E-9) & (ticks <= x1+1.E-9)], 9))
+        lats  = np.asarray(ylocator.tick_values(smin, smax), dtype=np.float64)
+        lats  = lats[(lats >= smin) & (lats <= smax)]
+
+        key   = (tuple(ticks), tuple(lats))
+        cache = window.setdefault('gridlines', {})
+        if (key not in cache):
+            steps = 100
+            lines = [np.column_stack((np.full(steps, tick), np.linspace(smin, smax, steps))) for tick in ticks]
+            lines = lines + [np.column_stack((np.linspace(x0, x1, steps), np.full(steps, lat))) for lat in lats]
+            projected = self.__proj.project_geometry(shapely.MultiLineString(lines), ccrs.PlateCarree(central_longitude=clon))
+            segments  = []
+            for line in getattr(projected, 'geoms', [projected]):
+                xy = np.asarray(line.coords)[:,:2]
+                if (len(xy) > 1):
+                    segments.append(np.column_stack((np.clip(xy[:,0], *self.__proj.x_limits),
+                                                     np.clip(xy[:,1], *self.__proj.y_limits))))
+            lon_ticks = (ticks + clon + 180.) % 360. - 180.
+            cache[key] = (segments, lon_ticks, lats)
+            self.__window_put(window, 'gridlines', cache)
+
+        return cache[key]
+
 
     def gxout(self, method, cmap=None, colors=None):
-        # Set plot method : contour, shade/contourf, hatches, or vector
-        method_allowed = ['contour', 'shaded', 'hatches', 'vector']
+        # Set plot method : contour, shade/contourf, hatches, vector, or raster/grid (pcolormesh)
+        method_allowed = ['contour', 'shaded', 'hatches', 'vector', 'raster', 'grid']
         method = method.lower()
+        if (method == 'grid'):
+            method = 'raster'
         if (method in method_allowed):
             self.method = method
         else:
@@ -211,7 +423,394 @@ class mapplot:
     # 'transform' argument cannot be changed
     # "y" option is acceptable only if method=vector
     def display(self, data, y=None, **kwargs):
-        # Default parameter settings for each method
+        args = self.__display_args(**kwargs)
+
+        if (self.method != 'vector'):
+            if (y is not None):
+                warnings.warn('Argument "y" was provided to display(), but it is only acceptable when method="vector"', UserWarning)
+
+        self.__draw(data, y, **args)
+        self.__blit_reset()
+
+
+    # Replace the artist of self.method with new data and redraw only that artist (blitting)
+    # The background (map, labels, colorbars, and the other layers) is kept as a bitmap,
+    # and captured again whenever the canvas is fully drawn (first update, resize, zoom, savefig, ...).
+    # The coastlines, the meridians and parallels, and the map boundary are drawn over the replaced artist with it.
+    # Canvases without blitting are redrawn by draw_idle()
+    # Keep "levels" fixed if a colorbar is shown
+    def update(self, data, y=None, **kwargs):
+        args = self.__display_args(**kwargs)
+
+        if (self.method != 'vector'):
+            if (y is not None):
+                warnings.warn('Argument "y" was provided to update(), but it is only acceptable when method="vector"', UserWarning)
+
+        canvas = self.fig.canvas
+        if (not canvas.supports_blit):
+            if (self.method != 'raster'):
+                self.__remove_artist(self.method)
+            self.__draw(data, y, update=True, **args)
+            canvas.draw_idle()
+            return
+
+        # The replacement does not request a full redraw of an interactive figure
+        callback = self.fig.stale_callback
+        self.fig.stale_callback = None
+        try:
+            # Raster plot is not replaced : only the color array is updated
+            if (self.method != 'raster'):
+                self.__remove_artist(self.method)
+            self.__draw(data, y, update=True, **args)
+            # Lines of the gridliner are projected once to be drawn with the artist
+            if (self.gridlines is not None and self.__gridline_lines is None and (self.gridlines.xlines or self.gridlines.ylines)):
+                self.__set_gridline_lines()
+                self.__blit_reset()
+        finally:
+            self.fig.stale_callback = callback
+
+        if (self.__blit is None):
+            self.__blit = {'background': None,
+                           'artists'   : {},
+                           'capturing' : False,
+                           'callback'  : canvas.mpl_connect('draw_event', self.__blit_capture),
+                          }
+        self.__blit['artists'][self.method] = self.__artist(self.method)
+
+        with self.__stage('update.blit'):
+            if (self.__blit['background'] is None):
+                # The draw_event captures the background and draws the animated artists
+                self.__animate()
+                canvas.draw()
+            else:
+                self.__animate()
+                canvas.restore_region(self.__blit['background'])
+                self.__draw_animated()
+                canvas.blit(self.fig.bbox)
+            canvas.flush_events()
+
+
+    # Artists of update() and the coastlines are animated : excluded from the full draw of the canvas and drawn by blitting
+    # Only the artists still in the axes are kept
+    def __animate(self):
+        artists = self.__blit['artists']
+        for method in list(artists):
+            if (artists[method] is not self.__artist(method)):
+                del artists[method]
+        for artist in self.__animated_artists():
+            artist.set_animated(True)
+
+
+    def __animated_artists(self):
+        artists = [artist for artist in self.__blit['artists'].values() if (artist is not None)]
+        # cartopy draws the cells of pcolormesh crossing the seam by a separate collection
+        artists = artists + [artist._wrapped_collection_fix for artist in artists if (hasattr(artist, '_wrapped_collection_fix'))]
+        if (self.__coastline is not None):
+            artists.append(self.__coastline)
+        if (self.__gridline_lines is not None):
+            artists.append(self.__gridline_lines)
+        if ('geo' in self.ax.spines):
+            artists.append(self.ax.spines['geo'])
+        return sorted(artists, key=lambda artist: artist.get_zorder())
+
+
+    # The background is captured again by the next update()
+    def __blit_reset(self):
+        if (self.__blit is not None):
+            self.__blit['background'] = None
+
+
+    def __draw_animated(self):
+        for artist in self.__animated_artists():
+            self.ax.draw_artist(artist)
+
+
+    # Callback of draw_event : the canvas has been drawn without the animated artists
+    # savefig() draws the animated artists, so the background is captured again by the next update()
+    def __blit_capture(self, event):
+        if (self.__blit['capturing']):
+            return
+        if (self.fig.canvas.is_saving()):
+            self.__blit['background'] = None
+            return
+        self.__blit['capturing'] = True
+        try:
+            canvas = self.fig.canvas
+            self.__blit['background'] = canvas.copy_from_bbox(self.fig.bbox)
+            self.__draw_animated()
+        finally:
+            self.__blit['capturing'] = False
+
+
+    # Render a time series frame by frame
+    # The static layers (map, coastlines, gridlines, and colorbar) are kept,
+    # and only the artist of self.method is replaced for each frame.
+    # Each frame is written to fname.format(index) and/or grabbed by an animation writer
+    # If method=vector, each item of frames must be a tuple of x and y components
+    def render_frames(self, frames, fname=None, writer=None, cbar=None, dpi=None, **kwargs):
+        if (cbar is not None and self.method in ('contour', 'shaded') and 'levels' not in kwargs):
+            raise TypeError('render_frames() needs argument "levels" to keep the colorbar fixed')
+        if (cbar is True):
+            cbar = {}
+
+        savefig_args = {}
+        if (dpi is not None):
+            savefig_args['dpi'] = dpi
+
+        args  = self.__display_args(**kwargs)
+        count = 0
+        start = time.perf_counter()
+        for frame in frames:
+            if (self.method == 'vector'):
+                x, y = frame
+            else:
+                x, y = frame, None
+
+            # Replace the data-dependent artist only
+            # Raster plot is not replaced : only the color array is updated
+            if (self.method != 'raster'):
+                self.__remove_artist(self.method)
+            self.__draw(x, y, update=True, **args)
+
+            if (count == 0 and cbar is not None):
+                self.set_cbar(**cbar)
+
+            with self.__stage('render_frames.output'):
+                if (fname is not None):
+                    self.fig.savefig(fname.format(count), **savefig_args)
+                if (writer is not None):
+                    writer.grab_frame()
+                if (fname is None and writer is None):
+                    self.fig.canvas.draw()
+            count += 1
+
+        elapsed = time.perf_counter() - start
+        stats   = {'frames' : count  ,
+                   'seconds': elapsed,
+                   'fps'    : count / elapsed if (elapsed > 0) else 0.,
+                  }
+        if (self.__kwargs['verbose']):
+            print(f'render_frames : {stats["frames"]} frames in {stats["seconds"]:.2f} s ({stats["fps"]:.2f} fps)')
+
+        return stats
+
+
+    # Write frames to a movie file with a matplotlib animation writer
+    # writer : name of a registered writer (e.g., "ffmpeg", "pillow") or a MovieWriter object
+    def animate(self, frames, outfile, fps=10, writer=None, dpi=None, cbar=None, **kwargs):
+        if (writer is None):
+            if (outfile.lower().endswith('.gif')):
+                writer = 'pillow'
+            else:
+                writer = mpl.rcParams['animation.writer']
+        if (isinstance(writer, str)):
+            if (not manimation.writers.is_available(writer)):
+                raise ValueError(f'Animation writer "{writer}" is not available. Options : ' + ', '.join(manimation.writers.list()))
+            writer = manimation.writers[writer](fps=fps)
+
+        with writer.saving(self.fig, outfile, dpi):
+            stats = self.render_frames(frames, writer=writer, cbar=cbar, **kwargs)
+
+        return stats
+
+
+    # Render Web Mercator tiles of the zoom levels to directory/{version}/{z}/{x}/{y}.{format} (XYZ scheme : y=0 at the north)
+    # The instance must be created with projection=ccrs.Mercator.GOOGLE, and the tiles are styled by gxout() and kwargs of display()
+    # Each tile reads only its window of data.
+    # Tiles outside the data, with all data missing, or drawn fully transparent are empty and not written.
+    # The manifest directory/tiles.json keeps the digest of the style and data window of each tile, and the file of its latest version.
+    # Unchanged tiles are not rendered again : the file is kept, or hard-linked (copied) from the previous version.
+    # If method=vector, "y" is the y component
+    def render_tiles(self, directory, data, y=None, zooms=range(0, 5), version=None, tile_size=256, format='png', **kwargs):
+        if (not isinstance(self.__proj, ccrs.Mercator) or abs(self.__proj.x_limits[1] - _WEB_MERCATOR) > 1. or self.central_longitude != 0.):
+            raise ValueError('render_tiles() needs a mapplot created with projection=ccrs.Mercator.GOOGLE')
+        if (self.__unstructured):
+            raise ValueError(f'render_tiles() is not available for grid="{self.grid}" : regular grids only')
+        if (self.method == 'vector' and y is None):
+            raise TypeError('render_tiles() needs argument "y" for method="vector"')
+
+        args   = self.__display_args(**kwargs)
+        reduce = args.pop('reduce', None)
+        style  = {'method'    : self.method                     ,
+                  'cmap'      : self.cmap                       ,
+                  'colors'    : self.colors                     ,
+                  'kwargs'    : {key: value for key, value in kwargs.items() if (key != 'reduce')},
+                  'reduce'    : reduce and {key: reduce[key] for key in ('op', 'q', 'ddof')},
+                  'level'     : int(self.levidx)                ,
+                  'tile_size' : tile_size                       ,
+                  'format'    : format                          ,
+                  'coastline' : self.__coastline_on and self.__cl_resolution,
+                 }
+        style  = json.dumps(style, sort_keys=True, default=_style_token).encode()
+
+        manifest = _tile_manifest_load(directory)
+        manifest['version'] = version
+        tiles    = manifest['tiles']
+        root     = directory if (version is None) else os.path.join(directory, str(version))
+        stats    = {'tiles': 0, 'rendered': 0, 'unchanged': 0, 'empty': 0}
+
+        # The axes fills a transparent figure of tile_size pixels
+        dpi      = self.fig.dpi
+        inches   = tile_size / dpi
+        if (int(inches * dpi) < tile_size):
+            inches = np.nextafter(inches, np.inf)
+        saved    = {'size'    : self.fig.get_size_inches(),
+                    'position': self.ax.get_position(original=True),
+                    'face'    : self.fig.patch.get_alpha(),
+                    'patch'   : self.ax.patch.get_visible(),
+                    'spine'   : self.ax.spines['geo'].get_visible(),
+                    'axes'    : [(ax, ax.get_visible()) for ax in self.fig.axes if (ax is not self.ax)],
+                   }
+        start = time.perf_counter()
+        try:
+            self.fig.set_size_inches(inches, inches)
+            self.ax.set_position([0., 0., 1., 1.])
+            self.fig.patch.set_alpha(0.)
+            self.ax.patch.set_visible(False)
+            self.ax.spines['geo'].set_visible(False)
+            for ax, visible in saved['axes']:
+                ax.set_visible(False)
+
+            for z in zooms:
+                count = 2**z
+                width = 2. * _WEB_MERCATOR / count
+                for tx in range(count):
+                    for ty in range(count):
+                        stats['tiles'] += 1
+                        x0   = -_WEB_MERCATOR + width * tx
+                        y1   =  _WEB_MERCATOR - width * ty
+                        name = f'{z}/{tx}/{ty}'
+                        path = os.path.join(root, str(z), str(tx), f'{ty}.{format}')
+                        with self.__stage('render_tiles.window'):
+                            self.ax.set_xlim(x0, x0 + width)
+                            self.ax.set_ylim(y1 - width, y1)
+                            window = self.__get_window()
+                        digest, data_pass, y_pass = self.__tile_data(window, data, y, style, reduce)
+
+                        record = tiles.get(name)
+                        if (record is not None and record['digest'] == digest):
+                            if (_tile_reuse(directory, record, path)):
+                                stats['unchanged'] += 1
+                                continue
+
+                        image = None
+                        if (digest != 'empty'):
+                            self.__remove_artist(self.method)
+                            self.__set_coastlines()
+                            self.__draw_window(window, data_pass, y_pass, **dict(args))
+                            with self.__stage('render_tiles.draw'):
+                                image = self.to_rgba()
+                            if (not np.any(image[:,:,3])):
+                                image = None
+
+                        if (image is None):
+                            stats['empty'] += 1
+                            tiles[name] = {'digest': digest, 'path': None}
+                            if (os.path.exists(path)):
+                                os.remove(path)
+                            continue
+
+                        with self.__stage('render_tiles.write'):
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                            temp = f'{path}.{os.getpid()}.tmp'
+                            mimage.imsave(temp, image, format=format)
+                            os.replace(temp, path)
+                        stats['rendered'] += 1
+                        tiles[name] = {'digest': digest, 'path': os.path.relpath(path, directory)}
+        finally:
+            _tile_manifest_save(directory, manifest)
+            self.fig.set_size_inches(saved['size'])
+            self.ax.set_position(saved['position'])
+            self.fig.patch.set_alpha(saved['face'])
+            self.ax.patch.set_visible(saved['patch'])
+            self.ax.spines['geo'].set_visible(saved['spine'])
+            for ax, visible in saved['axes']:
+                ax.set_visible(visible)
+            self.set_extent()
+
+        stats['seconds'] = time.perf_counter() - start
+        if (self.__kwargs['verbose']):
+            print(f'render_tiles : {stats["rendered"]} rendered, {stats["unchanged"]} unchanged, {stats["empty"]} empty '
+                  f'of {stats["tiles"]} tiles in {stats["seconds"]:.2f} s')
+
+        return stats
+
+
+    # Data of the tile window and its digest
+    # The digest is "empty" if the tile is outside the data (nothing is read) or all data in the window are missing
+    def __tile_data(self, window, data, y, style, reduce=None):
+        lmin, lmax, smin, smax = window['bounds']
+        if (smax < self.lat.min() or smin > self.lat.max()):
+            return 'empty', None, None
+        if (not self.__cyclic):
+            # Longitude span of the data from lon[0]
+            span = np.sum(np.diff(self.lon.astype(np.float64)) % 360.)
+            if ((lmin - self.lon[0]) % 360. > span and (self.lon[0] - lmin) % 360. > lmax - lmin):
+                return 'empty', None, None
+
+        with self.__stage('render_tiles.read'):
+            data_pass = self.__read_field(data, window, 'x', reduce)
+            y_pass    = None
+            if (self.method == 'vector'):
+                y_pass = self.__read_field(y, window, 'y', reduce)
+
+        digest  = hashlib.blake2b(style, digest_size=20)
+        missing = True
+        for block in (data_pass, y_pass):
+            if (block is None):
+                continue
+            values = np.ma.getdata(block)
+            mask   = np.ma.getmaskarray(block)
+            if (np.issubdtype(values.dtype, np.inexact)):
+                mask = mask | ~np.isfinite(values)
+            missing = missing and bool(np.all(mask))
+            digest.update(np.ascontiguousarray(values).data)
+            digest.update(np.ascontiguousarray(mask).data)
+        digest.update(np.ascontiguousarray(window['lon'], dtype=np.float64).data)
+        digest.update(np.ascontiguousarray(window['lat'], dtype=np.float64).data)
+        if (missing):
+            return 'empty', None, None
+
+        return digest.hexdigest(), data_pass, y_pass
+
+
+    # Encoded image of the figure without temporary files
+    # format : any format of savefig (png, webp, jpg, svg, pdf, ...), or "rgba"/"raw" for the raw RGBA buffer of to_rgba()
+    # All arguments from matplotlib savefig are available
+    def to_bytes(self, format='png', dpi=None, **kwargs):
+        if (format.lower() in ('rgba', 'raw')):
+            return self.to_rgba(dpi=dpi).tobytes()
+        # The rasterized plots of vector formats are drawn at the dpi of savefig()
+        if (dpi is None and self.__output['rasterize'] and format.lower() in ('pdf', 'svg', 'svgz', 'eps', 'ps')):
+            dpi = self.__output['dpi']
+
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format=format, dpi=dpi, **kwargs)
+        return buffer.getvalue()
+
+
+    # Pixels of the figure drawn by Agg : ndarray of uint8 with shape (height, width, 4)
+    # A figure whose canvas is not Agg (e.g., Figure() without pyplot) is given an Agg canvas
+    def to_rgba(self, dpi=None):
+        canvas = self.fig.canvas
+        if (not isinstance(canvas, FigureCanvasAgg)):
+            canvas = FigureCanvasAgg(self.fig)
+
+        original = self.fig.dpi
+        if (dpi is not None):
+            self.fig.set_dpi(dpi)
+        try:
+            canvas.draw()
+            image = np.array(canvas.buffer_rgba())
+        finally:
+            if (dpi is not None):
+                self.fig.set_dpi(original)
+
+        return image
+
+
+    # Default parameter settings for each method
+    def __display_args(self, **kwargs):
         if (self.method == 'contour'):
             defaults = {'linestyles': 'solid'}
         elif (self.method == 'shaded'):
@@ -220,6 +819,8 @@ class mapplot:
             defaults = {'size': 0.3, 'color': 'black', 'marker': '.', 'interval': 3}
         elif (self.method == 'vector'):
             defaults = {'angles': 'xy', 'scale_units': 'xy', 'width': 0.003, 'headlength': 2, 'headwidth': 2, 'color': 'black', 'regrid_shape': 30,}
+        elif (self.method == 'raster'):
+            defaults = {'extend': 'both'}
 
         args = defaults.copy()
         #if (self.cmap is not None):
@@ -250,57 +851,603 @@ class mapplot:
         args['transform'] = self.__crs
         if ('transform' in kwargs):
             warnings.warn('"transform" argument was overridden in display()', UserWarning)
+        if (args.get('mask') not in (None, 'land', 'ocean')):
+            raise ValueError(f'Invalid mask : {args["mask"]}. Expected "land", "ocean", or None')
+        if (args.get('reduce') is not None):
+            if (self.method == 'hatches'):
+                raise ValueError('"reduce" is not available for method="hatches"')
+            args['reduce'] = _reduce_spec(args['reduce'], self.method == 'vector')
+
+        return args
+
+
+    # Plot data with the arguments prepared by __display_args()
+    # If update=True, the existing raster plot only receives the new color array
+    def __draw(self, data, y=None, update=False, **args):
+        reduce = args.pop('reduce', None)
+        if (self.__unstructured):
+            self.__draw_points(data, y, reduce, **args)
+            return
+
+        # Only the selected level in the plotted area (and a small halo) is read and passed to cartopy
+        # The cyclic point is filled by the wrap layout of the window
+        with self.__stage('display.window'):
+            window = self.__get_window()
+        with self.__stage('display.read'):
+            data_pass = self.__read_field(data, window, 'x', reduce)
+            y_pass = None
+            if (self.method == 'vector'):
+                y_pass = self.__read_field(y, window, 'y', reduce)
+
+        self.__draw_window(window, data_pass, y_pass, update, **args)
+
+
+    # Plot the data already read in the window
+    def __draw_window(self, window, data_pass, y_pass=None, update=False, **args):
+        mask = args.pop('mask', None)
+        if (mask is not None):
+            with self.__stage('display.mask'):
+                hidden    = self.__mask_window(window, mask)
+                data_pass = self.__apply_mask(data_pass, hidden)
+                if (y_pass is not None):
+                    y_pass = self.__apply_mask(y_pass, hidden)
+
+        lod = args.pop('lod', None)
+        if (lod is not None and lod is not False):
+            if (self.method == 'contour' or self.method == 'shaded'):
+                with self.__stage('display.lod'):
+                    window, data_pass = self.__lod_window(window, data_pass, lod)
+            else:
+                warnings.warn(f'"lod" is ignored for method="{self.method}"', UserWarning)
 
-        if (self.method != 'vector'):
-            if (y is not None):
-                warnings.warn('Argument "y" was provided to display(), but it is only acceptable when method="vector"', UserWarning)
+        # Plot
+        with self.__stage('display.' + self.method):
+            if (self.method == 'contour'):
+                self.__plot_contour(window, data_pass, **args)
+            elif (self.method == 'shaded'):
+                self.__plot_shaded(window, data_pass , **args)
+            elif (self.method == 'hatches'):
+                self.__plot_hatches(window, data_pass, **args)
+            elif (self.method == 'vector'):
+                self.__plot_vector(window, data_pass, y_pass, **args)
+            elif (self.method == 'raster'):
+                self.__plot_raster(window, data_pass, update, **args)
+
+        self.__profile_draw(self.__artist(self.method), 'draw.' + self.method)
+        self.__output_layer(self.method)
+
+
+    # Plot data on a curvilinear grid or points with the triangulation of the points in the plotted area
+    # contour, shaded, and raster use tricontour, tricontourf, and tripcolor
+    def __draw_points(self, data, y=None, reduce=None, **args):
+        if (args.pop('lod', None) not in (None, False)):
+            warnings.warn(f'"lod" is ignored for grid="{self.grid}"', UserWarning)
+
+        with self.__stage('display.triangulation'):
+            entry = self.__triangulation()
+        with self.__stage('display.read'):
+            if (reduce is None):
+                values   = self.__read_points(data, entry)
+                y_values = None
+                if (self.method == 'vector'):
+                    y_values = self.__read_points(y, entry)
+            else:
+                values   = self.__reduce_points(data, entry, reduce, 0)
+                y_values = None
+                if (self.method == 'vector'):
+                    y_values = self.__reduce_points(y, entry, reduce, 1)
+
+        mask = args.pop('mask', None)
+        if (mask is not None):
+            with self.__stage('display.mask'):
+                hidden = self.__mask_window(self.__get_window(), mask)
+                values = self.__apply_mask(values, hidden)
+                if (y_values is not None):
+                    y_values = self.__apply_mask(y_values, hidden)
+
+        with self.__stage('display.' + self.method):
+            if (self.method == 'contour' or self.method == 'shaded' or self.method == 'raster'):
+                triangulation = self.__field_triangulation(entry, values)
+                # The triangulation is already in the coordinate of the projection, and the triangles repeated
+                # beyond the edge of the map are clipped by the axes instead of being cut by cartopy
+                args['transform'] = self.ax.transData
+            if (self.method == 'contour'):
+                self.cont   = self.ax.tricontour(triangulation, values, **args)
+            elif (self.method == 'shaded'):
+                self.shade  = self.ax.tricontourf(triangulation, values, **args)
+            elif (self.method == 'raster'):
+                self.raster = self.ax.tripcolor(triangulation, values, **self.__raster_args(args))
+            elif (self.method == 'hatches'):
+                self.__plot_hatches_points(entry, values, **args)
+            elif (self.method == 'vector'):
+                self.__plot_vector_points(entry, values, y_values, **args)
+
+        self.__profile_draw(self.__artist(self.method), 'draw.' + self.method)
+        self.__output_layer(self.method)
+
+
+    # Triangulation of the points in the plotted area in the coordinate of the projection
+    # Cached for each grid, projection, and extent : in the window, in memory, and on disk (see set_triangulation_cache())
+    def __triangulation(self):
+        window = self.__get_window()
+        if ('triangulation' in window):
+            return window['triangulation']
+
+        key   = _triangulation_key(self.__grid_key, self.__proj, window['bounds'])
+        entry = _triangulation_get(key)
+        if (entry is None):
+            entry = self.__build_triangulation(window['bounds'])
+            _triangulation_put(key, entry)
+        self.__window_put(window, 'triangulation', entry)
+
+        return entry
+
+
+    # Delaunay triangulation of the projected points in the bounds and a margin
+    # On cylindrical projections, the points near the edge of the map are repeated on the other side, so that the triangles reach the edge.
+    # Triangles wider than half of the map cross the seam of the projection and are masked.
+    def __build_triangulation(self, bounds):
+        lmin, lmax, smin, smax = bounds
+        lon   = self.__point_lon
+        lat   = self.__point_lat
+        valid = np.isfinite(lon) & np.isfinite(lat)
+
+        # Margin : a few times of the mean spacing of the points
+        spacing = np.sqrt(41253. / np.count_nonzero(valid))
+        dlon    = max((lmax - lmin) * 0.05, 3. * spacing)
+        dlat    = max((smax - smin) * 0.05, 3. * spacing)
+        select  = valid & (lat >= smin - dlat) & (lat <= smax + dlat)
+        if (lmax - lmin + 2.*dlon < 360.):
+            select &= ((lon - lmin + dlon) % 360. <= lmax - lmin + 2.*dlon)
+        index  = np.flatnonzero(select)
+        points = self.__proj.transform_points(self.__crs, lon[index], lat[index])
+        finite = np.isfinite(points[:,0]) & np.isfinite(points[:,1])
+        index  = index[finite]
+        x      = points[finite,0]
+        y      = points[finite,1]
+        if (index.size < 3):
+            raise ValueError('Too few points in the plotted area to triangulate')
+
+        x0, x1 = self.__proj.x_limits
+        width  = x1 - x0
+        if (isinstance(self.__proj, (ccrs.PlateCarree, ccrs.Mercator))):
+            margin = width * 3. * spacing / 360.
+            west   = x < x0 + margin
+            east   = x > x1 - margin
+            index  = np.concatenate((index, index[west], index[east]))
+            x      = np.concatenate((x, x[west] + width, x[east] - width))
+            y      = np.concatenate((y, y[west], y[east]))
+
+        triangles = mtri.Triangulation(x, y).triangles
+        xt        = x[triangles]
+        seam      = (xt.max(axis=1) - xt.min(axis=1)) > 0.5 * width
+
+        return {'x'        : x.astype(np.float64)        ,
+                'y'        : y.astype(np.float64)        ,
+                'triangles': triangles.astype(np.int32)  ,
+                'mask'     : seam                        ,
+                'index'    : index.astype(np.int64)      ,
+               }
+
+
+    # Triangulation for the values : triangles with missing values are masked in addition
+    # The Triangulation without missing values is kept in the entry, so that matplotlib reuses its internal structures
+    def __field_triangulation(self, entry, values):
+        if (np.issubdtype(values.dtype, np.inexact)):
+            missing = ~np.isfinite(values)
+        else:
+            missing = np.zeros(values.shape, dtype=bool)
+
+        if (not np.any(missing)):
+            if ('triangulation' not in entry):
+                entry['triangulation'] = mtri.Triangulation(entry['x'], entry['y'], entry['triangles'], mask=entry['mask'])
+            return entry['triangulation']
+
+        mask = entry['mask'] | np.any(missing[entry['triangles']], axis=1)
+        return mtri.Triangulation(entry['x'], entry['y'], entry['triangles'], mask=mask)
+
+
+    # Values of the selected level at the points of the triangulation
+    # Masked values are NaN (False for bool)
+    def __read_points(self, data, entry):
+        if (not hasattr(data, 'ndim') or not hasattr(data, '__getitem__')):
+            data = np.asarray(data)
+        if (data.ndim == self.lon.ndim and data.shape == self.lon.shape):
+            lev = ()
+        elif (data.ndim == self.lon.ndim + 1 and data.shape[1:] == self.lon.shape):
+            lev = (self.levidx,)
+        else:
+            raise ValueError(f'Invalid data shape for display(): expected {self.lon.shape} or (lev,)+{self.lon.shape} for grid="{self.grid}", got {data.shape}.')
 
-        data_pass = self.__select_level(data)
+        values = self.__materialize(data[lev])
+        values = values.reshape(-1)[entry['index']]
+        if (np.ma.isMaskedArray(values)):
+            if (np.issubdtype(values.dtype, np.bool_)):
+                values = values.filled(False)
+            else:
+                values = values.astype(np.float64).filled(np.nan)
 
-        data_pass, dummy = add_cyclic_point(data_pass, coord=self.lon)
+        return values
 
-        # Plot
-        if (self.method == 'contour'):
-            self.__plot_contour(data_pass, **args)
-        elif (self.method == 'shaded'):
-            self.__plot_shaded(data_pass , **args)
-        elif (self.method == 'hatches'):
-            self.__plot_hatches(data_pass, **args)
-        elif (self.method == 'vector'):
-            y_pass = self.__select_level(y)
-            y_pass, dummy = add_cyclic_point(y_pass, coord=self.lon)
-            self.__plot_vector(data_pass, y_pass, **args)
 
+    # Dots on the points where data is True : every interval-th point is used
+    def __plot_hatches_points(self, entry, data, **kwargs):
+        if (not np.issubdtype(data.dtype, np.bool_)):
+            raise TypeError('Invalid data type was provided to display(). When method="hatches", array must be a bool type')
+
+        interval = kwargs['interval']
+        # The points repeated at the edge are not dotted twice
+        count = np.unique(entry['index'], return_index=True)[1]
+        dots  = count[data[count]][::interval]
+
+        args = kwargs.copy()
+        if ('s' not in args):
+            args['s'] = args['size']
+        if ('c' not in args):
+            args['c'] = args['color']
+        for key in ('interval', 'spacing', 'size', 'cmap', 'colors', 'color'):
+            args.pop(key, None)
+        args['transform'] = self.__proj
+        self.hatch = self.ax.scatter(entry['x'][dots],
+                                     entry['y'][dots],
+                                     **args          )
+
+
+    # Vectors at the points : cartopy transforms (and regrids if regrid_shape is given) the vectors
+    def __plot_vector_points(self, entry, x, y, **kwargs):
+        count = np.unique(entry['index'], return_index=True)[1]
+        index = entry['index'][count]
+        kwargs.pop('target_extent', None)
+        if (kwargs.get('regrid_shape') is None):
+            kwargs.pop('regrid_shape', None)
+        kwargs['transform'] = self.__crs
+
+        valid = np.isfinite(x[count]) & np.isfinite(y[count])
+        self.vector = self.ax.quiver(self.__point_lon[index][valid],
+                                     self.__point_lat[index][valid],
+                                     x[count][valid]               ,
+                                     y[count][valid]               ,
+                                     **kwargs                      )
 
-    def __plot_contour(self, data, **kwargs):
+        # Representative length of arrows for vector legend
+        lens = x*x + y*y
+        percentile = np.nanpercentile(lens, 80)     # 80 percentile
+        self.vector_repr = self.__round5(np.sqrt(percentile))
 
-        self.cont = self.ax.contour(self.mglon,
-                                    self.mglat,
-                                    data      ,
-                                    **kwargs  )
 
+    # Points of the window hidden by mask="land" (the ocean is hidden) or mask="ocean" (the land is hidden)
+    # The land of the entire grid is rasterized once (see _land_mask()), and its window is cached with the window
+    def __mask_window(self, window, mask):
+        cache = window.setdefault('land', {})
+        land  = cache.get(self.__cl_resolution)
+        if (land is None):
+            full = _land_mask(self.lon, self.lat, self.__cl_resolution, regular=(not self.__unstructured))
+            if (self.__unstructured):
+                land = full.reshape(-1)[window['triangulation']['index']]
+            else:
+                land   = full[window['latidx'],:]
+                lonidx = window['lonidx']
+                land   = land[:,lonidx] if isinstance(lonidx, slice) else np.take(land, lonidx, axis=1)
+            cache[self.__cl_resolution] = land
+            self.__window_put(window, 'land', cache)
+
+        if (mask == 'land'):
+            return ~land
+        return land
+
+
+    # Hide the points : False for bool data (hatches), NaN for vectors and the points of a triangulation, masked otherwise
+    def __apply_mask(self, data, hidden):
+        if (np.issubdtype(data.dtype, np.bool_)):
+            return np.ma.getdata(data) & ~hidden
+        masked = np.ma.array(data, mask=(np.ma.getmaskarray(data) | hidden), copy=False)
+        if (self.__unstructured or self.method == 'vector'):
+            return masked.astype(np.float64).filled(np.nan)
+        return masked
+
+
+    # Level of detail : the window is block-averaged so that about lod grid points cover one pixel of the output
+    # The number of pixels is estimated from the size of the axes and the larger of figure.dpi and savefig.dpi
+    # The blocks and the reduced coordinates are cached in the window for each reduction factor
+    def __lod_window(self, window, data, lod):
+        if (lod is True):
+            lod = 1.
+        if (isinstance(lod, bool) or not np.isscalar(lod) or lod <= 0):
+            raise ValueError(f'Invalid lod : {lod}. Expected True or a positive number of grid points per pixel')
+
+        dpi = self.fig.dpi
+        if (mpl.rcParams['savefig.dpi'] != 'figure'):
+            dpi = max(dpi, float(mpl.rcParams['savefig.dpi']))
+        self.ax.apply_aspect()
+        width  = self.ax.bbox.width  * dpi / self.fig.dpi
+        height = self.ax.bbox.height * dpi / self.fig.dpi
+
+        nlat, nlon = data.shape
+        fx = max(int(nlon / (width  * lod)), 1)
+        fy = max(int(nlat / (height * lod)), 1)
+        if (fx == 1 and fy == 1):
+            return window, data
+
+        cache   = window.setdefault('lod', {})
+        reduced = cache.get((fy, fx))
+        if (reduced is None):
+            # The cyclic column is not averaged, but copied from the first block
+            ncol = nlon - 1 if window['cyclic'] else nlon
+            rows = np.arange(0, nlat, fy)
+            cols = np.arange(0, ncol, fx)
+            lon  = np.add.reduceat(window['lon'][:ncol], cols) / np.diff(np.append(cols, ncol))
+            lat  = np.add.reduceat(window['lat']       , rows) / np.diff(np.append(rows, nlat))
+            if (window['cyclic']):
+                lon = np.append(lon, lon[0]+360.)
+
+            reduced = {'key'   : window['key'],
+                       'lon'   : lon,
+                       'lat'   : lat,
+                       'cyclic': window['cyclic'],
+                       'rows'  : rows,
+                       'cols'  : cols,
+                       'ncol'  : ncol,
+                      }
+            reduced['mglon'], reduced['mglat'] = self.__mesh(lon, lat)
+            cache[(fy, fx)] = reduced
+            self.__window_put(window, 'lod', cache)
+
+        return reduced, self.__block_mean(data, reduced)
+
+
+    # Mean of the blocks ignoring NaN and masked values : NaN if all values in a block are missing
+    def __block_mean(self, data, reduced):
+        values = data[:,:reduced['ncol']]
+        if (np.ma.isMaskedArray(values)):
+            values = np.ma.filled(values.astype(np.float64), np.nan)
+        else:
+            values = np.asarray(values, dtype=np.float64)
 
-    def __plot_shaded(self, data, **kwargs):
-        
-        self.shade = self.ax.contourf(self.mglon,
-                                      self.mglat,
-                                      data      ,
-                                      **kwargs  )
+        valid  = ~np.isnan(values)
+        values = np.where(valid, values, 0.)
+        sums   = np.add.reduceat(np.add.reduceat(values, reduced['rows'], axis=0), reduced['cols'], axis=1)
+        counts = np.add.reduceat(np.add.reduceat(valid.astype(np.int32), reduced['rows'], axis=0), reduced['cols'], axis=1)
+        mean   = np.full(sums.shape, np.nan)
+        np.divide(sums, counts, out=mean, where=(counts > 0))
 
+        if (reduced['cyclic']):
+            mean = np.concatenate([mean, mean[:,:1]], axis=1)
 
-    def __plot_hatches(self, data, **kwargs):
+        return mean
+
+
+    def __plot_contour(self, window, data, **kwargs):
+
+        self.cont = self.__contour(window, data, False, **kwargs)
+
+
+    def __plot_shaded(self, window, data, **kwargs):
+
+        self.shade = self.__contour(window, data, True, **kwargs)
+
+
+    # contour() or contourf() through the contour cache
+    # The data is contoured on the mesh in the coordinate of the projection if possible (see __contour_mesh()).
+    # The paths are cached after the projection, and passed to matplotlib in the coordinate of the projection,
+    # so that neither contourpy nor the projection of the paths runs on a hit.
+    def __contour(self, window, data, filled, **kwargs):
+        if (filled):
+            plot = self.ax.contourf
+        else:
+            plot = self.ax.contour
+
+        mesh = self.__contour_mesh(window)
+        if (mesh is None):
+            x, y, z, crs = window['mglon'], window['mglat'], data, self.__crs
+        else:
+            x, y, z, crs = mesh['x'], mesh['y'], self.__contour_data(mesh, data), self.__proj
+
+        key = _contour_key(self.__proj, window['lon'], window['lat'], data, filled, kwargs)
+        if (key is None):
+            args = kwargs.copy()
+            args['transform'] = crs
+            return plot(x, y, z, **args)
+
+        # The replay relies on the internals of QuadContourSet : any failure falls back to contour()/contourf()
+        try:
+            entry = _contour_get(key)
+            if (entry is None):
+                entry = self.__contour_entry(x, y, z, crs, filled, **kwargs)
+                _contour_put(key, entry)
+
+            args = kwargs.copy()
+            args['levels']    = entry['levels']
+            args['transform'] = self.__proj
+            proxy    = _contour_proxy(entry)
+            contours = plot(proxy, **args)
+            if (proxy._contour_generator.complete()):
+                return contours
+            contours.remove()
+            error = 'not all of the cached paths were used'
+        except (AttributeError, TypeError, ValueError, IndexError) as e:
+            error = f'{type(e).__name__}: {e}'
+        _contour_replay_failed(error)
+
+        args = kwargs.copy()
+        args['transform'] = crs
+        return plot(x, y, z, **args)
+
+
+    # Contour the data and project the paths of each level to the coordinate of the projection
+    def __contour_entry(self, x, y, z, crs, filled, **kwargs):
+        args = kwargs.copy()
+        args['transform'] = crs._as_mpl_transform(self.ax)
+        contours = mcontour.QuadContourSet(self.ax, x, y, z, filled=filled, **args)
+        contours.remove()
+
+        project  = InterProjectionTransform(crs, self.__proj)
+        vertices = []
+        codes    = []
+        for path in contours.get_paths():
+            if (len(path.vertices) > 0 and crs is not self.__proj):
+                path = project.transform_path(path)
+            if (path.codes is None):
+                path = Path(path.vertices, np.full(len(path.vertices), Path.LINETO, dtype=Path.code_type))
+                if (len(path.vertices) > 0):
+                    path.codes[0] = Path.MOVETO
+            # Rounding errors on the boundary would make cartopy project the paths again when they are drawn
+            vertices.append(np.column_stack((np.clip(path.vertices[:,0], *self.__proj.x_limits),
+                                             np.clip(path.vertices[:,1], *self.__proj.y_limits))))
+            codes.append(path.codes)
+
+        return {'levels'     : np.array(contours.levels, dtype=np.float64),
+                'zmin'       : float(contours.zmin),
+                'zmax'       : float(contours.zmax),
+                'mins'       : [float(v) for v in contours._mins],
+                'maxs'       : [float(v) for v in contours._maxs],
+                'corner_mask': contours._corner_mask,
+                'algorithm'  : contours._algorithm,
+                'vertices'   : vertices,
+                'codes'      : codes,
+               }
+
+
+    # Mesh of the window for contour and contourf in the coordinate of the projection : projected once and cached in the window
+    # Points of the entire longitude are rotated to start at edge_longitude, and the columns on the edge are
+    # interpolated from their two neighbors, so that the contours reach the seam of the map on both sides.
+    # None if the points cross the seam of the projection or leave its domain : the geographic mesh is contoured instead.
+    def __contour_mesh(self, window):
+        if ('contour' in window):
+            return window['contour']
+
+        lon  = window['lon']
+        mesh = {'cols': None}
+        if (window['cyclic']):
+            nlon = lon.size - 1
+            edge = lon[0] + (self.edge_longitude - lon[0]) % 360.
+            k    = int(np.searchsorted(lon, edge, side='right'))     # lon[k-1] <= edge < lon[k]
+            mesh['west']   = k - 1
+            mesh['east']   = k % nlon
+            mesh['weight'] = (edge - lon[k-1]) / (lon[k] - lon[k-1])
+            # The column on the edge is not repeated
+            count = nlon if (mesh['weight'] > 0.) else nlon - 1
+            order = np.arange(k, k+count)
+            mesh['cols'] = order % nlon
+            lon = np.concatenate(([edge+1.E-6], lon[mesh['cols']] + 360.*(order >= nlon), [edge+360.-1.E-6]))
+
+        x, y  = self.__project_mesh(lon, window['lat'])
+        width = np.abs(np.diff(self.__proj.x_limits)[0])
+        if (np.all(np.isfinite(x)) and np.all(np.isfinite(y)) and np.all(np.abs(np.diff(x, axis=-1)) < 0.5*width)):
+            mesh['x'] = x.astype(self.__coord_dtype)
+            mesh['y'] = y.astype(self.__coord_dtype)
+        else:
+            mesh = None
+        self.__window_put(window, 'contour', mesh)
+
+        return mesh
+
+
+    # Data of the window in the layout of __contour_mesh()
+    def __contour_data(self, mesh, data):
+        if (mesh['cols'] is None):
+            return data
+
+        w    = mesh['weight']
+        edge = (1.-w) * data[:,mesh['west']:mesh['west']+1] + w * data[:,mesh['east']:mesh['east']+1]
+        if (np.ma.isMaskedArray(data)):
+            return np.ma.concatenate([edge, data[:,mesh['cols']], edge], axis=1)
+        return np.concatenate([edge, data[:,mesh['cols']], edge], axis=1)
+
+
+    # Grid points of the window in the coordinate of the projection : projected once and cached in the window
+    # Points outside the domain of the projection are not valid, and NaN unless the projection is separable
+    # For separable projections, x, y, and valid are 2D views of 1D arrays
+    def __projected_points(self, window):
+        points = window.get('projected')
+        if (points is not None):
+            return points
+
+        x, y = self.__project_mesh(window['lon'], window['lat'])
+        if (self.__separable):
+            shape  = window['mglon'].shape
+            vx, vy = np.isfinite(x), np.isfinite(y)
+            if (np.all(vx)):
+                valid = np.broadcast_to(vy[:,np.newaxis], shape)
+            elif (np.all(vy)):
+                valid = np.broadcast_to(vx[np.newaxis,:], shape)
+            else:
+                valid = vy[:,np.newaxis] & vx[np.newaxis,:]
+            x, y = self.__mesh(np.where(vx, x, np.nan).astype(self.__coord_dtype), np.where(vy, y, np.nan).astype(self.__coord_dtype))
+        else:
+            valid = np.isfinite(x) & np.isfinite(y)
+            x     = np.where(valid, x, np.nan).astype(self.__coord_dtype)
+            y     = np.where(valid, y, np.nan).astype(self.__coord_dtype)
+        points = {'x': x, 'y': y, 'valid': valid}
+        self.__window_put(window, 'projected', points)
+
+        return points
+
+
+    # Derivatives of the coordinate of the projection with respect to longitude and latitude at the grid points of the window
+    # Computed once and cached in the window, to rotate vectors in the same way as cartopy's transform_vectors()
+    def __vector_basis(self, window):
+        basis = window.get('basis')
+        if (basis is not None):
+            return basis
+
+        points = self.__projected_points(window)
+        lon    = window['mglon']
+        lat    = window['mglat']
+        width  = np.abs(np.diff(self.__proj.x_limits)[0])
+        eps    = 1.E-3
+        basis  = {}
+        for name, dlon, dlat in [('lon', eps, 0.), ('lat', 0., eps)]:
+            # Forward difference, or backward difference beyond the pole and the seam of the projection
+            step = np.full(lon.shape, eps)
+            if (dlat > 0.):
+                step[lat + eps > 90.] = -eps
+            for i in range(2):
+                xyz = self.__proj.transform_points(self.__crs, lon + step*(dlon > 0.), lat + step*(dlat > 0.))
+                dx  = xyz[...,0] - points['x']
+                dy  = xyz[...,1] - points['y']
+                bad = ~(np.isfinite(dx) & np.isfinite(dy)) | (np.abs(dx) > 0.5*width)
+                if (i == 1 or not np.any(bad)):
+                    break
+                step[bad] *= -1.
+            basis['x'+name] = (dx / step).astype(self.__coord_dtype)
+            basis['y'+name] = (dy / step).astype(self.__coord_dtype)
+        self.__window_put(window, 'basis', basis)
+
+        return basis
+
+
+    # Rotate the vector (x, y) on the grid points of the window to the coordinate of the projection, keeping the magnitude
+    def __rotate_vector(self, window, x, y):
+        basis = self.__vector_basis(window)
+        x = np.ma.filled(x, np.nan).astype(np.float64, copy=False)
+        y = np.ma.filled(y, np.nan).astype(np.float64, copy=False)
+        u = basis['xlon'] * x + basis['xlat'] * y
+        v = basis['ylon'] * x + basis['ylat'] * y
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.hypot(x, y) / np.hypot(u, v)
+        scale[np.hypot(u, v) == 0.] = 0.
+
+        return np.ma.masked_invalid(u*scale), np.ma.masked_invalid(v*scale)
+
+
+    def __plot_hatches(self, window, data, **kwargs):
         if (not np.issubdtype(data.dtype, np.bool_)):
             raise TypeError('Invalid data type was provided to display(). When method="hatches", array must be a bool type')
 
+        if (kwargs.get('spacing') is not None):
+            self.__plot_hatches_spaced(window, data, **kwargs)
+            return
+
         interval = kwargs['interval']
 
         # Limit density of dots
-        work_lon  = self.mglon[::interval,::interval]
-        work_lat  = self.mglat[::interval,::interval]
-        work_data = data[::interval,::interval]
+        points    = self.__projected_points(window)
+        work_x    = points['x'][::interval,::interval]
+        work_y    = points['y'][::interval,::interval]
+        work_data = data[::interval,::interval] & points['valid'][::interval,::interval]
         y, x = np.where(work_data)
-        work_lon = work_lon[y,x]
-        work_lat = work_lat[y,x]
+        work_x = work_x[y,x]
+        work_y = work_y[y,x]
 
         args = kwargs.copy()
         if ('s' not in args):
@@ -309,36 +1456,118 @@ class mapplot:
             args['c'] = args['color']
         # Delete 'interval', 'size', 'colors' and 'color'
         args.pop('interval')
+        args.pop('spacing', None)
         args.pop('size'  , None)
         args.pop('cmap'  , None)
         args.pop('colors', None)
         args.pop('color' , None)
-        self.hatch = self.ax.scatter(work_lon,
-                                     work_lat,
+        args['transform'] = self.__proj
+        self.hatch = self.ax.scatter(work_x,
+                                     work_y,
                                      **args  )
 
 
-    def __plot_hatches_old(self, data, **kwargs):
-        if (not np.issubdtype(data.dtype, np.bool_)):
-            raise TypeError('Invalid data type was provided to display(). When method="hatches", array must be a bool type')
-
-        data = data.astype(int)
-        kwargs['levels'] = [0.09,1.01]
-        kwargs['colors'] = 'none'
-
-        self.hatch = self.ax.contourf(self.mglon,
-                                      self.mglat,
-                                      data      ,
-                                      **kwargs  )
-
+    # Draw at most one dot per spacing x spacing points box of the axes
+    # The dot nearest to the center of the box is kept, and all dots are drawn as one Line2D
+    def __plot_hatches_spaced(self, window, data, **kwargs):
+        index = self.__hatch_index(window, kwargs['spacing'])
 
-    def __plot_vector(self, x, y, **kwargs):
+        ids  = index['order'][np.asarray(data).ravel()[index['order']]]
+        bins = index['bins'][ids]
+        keep = np.ones(ids.size, dtype=bool)
+        keep[1:] = (bins[1:] != bins[:-1])
+        ids = ids[keep]
 
-        self.vector = self.ax.quiver(self.mglon,
-                                     self.mglat,
-                                     x         ,
-                                     y         ,
-                                     **kwargs  )
+        args = kwargs.copy()
+        # scatter's s is an area in points^2, markersize is a width in points
+        size  = args.pop('s', args.pop('size', None))
+        color = args.pop('c', args.pop('color', None))
+        for key in ['interval', 'spacing', 'size', 'color', 'cmap', 'colors', 'transform']:
+            args.pop(key, None)
+        if ('markersize' not in args):
+            args['markersize'] = np.sqrt(size)
+        if ('color' not in args):
+            args['color'] = color
+        args['linestyle'] = 'none'
+
+        self.hatch, = self.ax.plot(index['x'][ids],
+                                   index['y'][ids],
+                                   transform=self.__proj,
+                                   **args               )
+
+
+    # Points of the window in the coordinate of the projection, binned by spacing (points) on the display
+    # Ordered by bin and distance to the center of the bin, so the first True point in each bin is picked
+    # Cached for each window, spacing, and position of the axes
+    def __hatch_index(self, window, spacing):
+        if (spacing <= 0):
+            raise ValueError('Invalid spacing was provided to display(). spacing must be positive')
+
+        self.ax.apply_aspect()
+        bbox  = self.ax.bbox
+        key   = (spacing, tuple(bbox.bounds), self.fig.dpi)
+        cache = window.setdefault('hatches', {})
+        if (key in cache):
+            return cache[key]
+
+        points = self.__projected_points(window)
+        x = points['x'].ravel()
+        y = points['y'].ravel()
+        valid = points['valid'].ravel().copy()
+        disp  = np.full((x.size, 2), np.nan)
+        disp[valid] = self.ax.transData.transform(np.column_stack([x[valid], y[valid]]))
+        valid &= (disp[:,0] >= bbox.x0) & (disp[:,0] <= bbox.x1) & (disp[:,1] >= bbox.y0) & (disp[:,1] <= bbox.y1)
+
+        pixel = spacing * self.fig.dpi / 72.
+        cell  = (disp[valid] - [bbox.x0, bbox.y0]) / pixel
+        cidx  = np.floor(cell).astype(np.int64)
+        dist  = np.sum((cell - cidx - 0.5)**2, axis=1)
+        bins  = cidx[:,0] + cidx[:,1] * (int(bbox.width / pixel) + 2)
+        ids   = np.flatnonzero(valid)
+        order = np.lexsort((dist, bins))
+
+        index = {'x'    : x,
+                 'y'    : y,
+                 'order': ids[order],
+                 'bins' : np.full(x.size, -1, dtype=np.int64),
+                }
+        index['bins'][ids] = bins
+        cache.clear()
+        cache[key] = index
+        self.__window_put(window, 'hatches', cache)
+        return index
+
+
+    def __plot_vector(self, window, x, y, **kwargs):
+        regrid_shape  = kwargs.pop('regrid_shape' , None)
+        target_extent = kwargs.pop('target_extent', None)
+
+        if (regrid_shape is None):
+            # Drawn on the projected grid points with the cached rotation of the vectors
+            points = self.__projected_points(window)
+            u, v   = self.__rotate_vector(window, x, y)
+            u[~points['valid']] = np.ma.masked
+            v[~points['valid']] = np.ma.masked
+
+            kwargs['transform'] = self.__proj
+            self.vector = self.ax.quiver(np.where(points['valid'], points['x'], 0.),
+                                         np.where(points['valid'], points['y'], 0.),
+                                         u                                        ,
+                                         v                                        ,
+                                         **kwargs                                 )
+        else:
+            # Regridded with the cached interpolation weights, and drawn in the coordinate of the projection
+            if (target_extent is None):
+                target_extent = self.ax.get_extent(self.__proj)
+            regrid = _regrid_weights(window['lon'], window['lat'], self.__proj, target_extent, regrid_shape)
+            u, v   = self.__regrid_vector(regrid, x, y)
+
+            kwargs['transform'] = self.__proj
+            self.vector = self.ax.quiver(regrid['x'],
+                                         regrid['y'],
+                                         u          ,
+                                         v          ,
+                                         **kwargs   )
 
         # Representative length of arrows for vector legend
         lens = x*x + y*y
@@ -346,6 +1575,247 @@ class mapplot:
         self.vector_repr = self.__round5(np.sqrt(percentile))
 
 
+    # Raster plot by pcolormesh
+    # levels are converted to BoundaryNorm, so that the colorbar is the same as contourf
+    def __plot_raster(self, window, data, update=False, **kwargs):
+        mesh = self.__raster_mesh(window)
+
+        # Columns of the cells
+        if (mesh['cols'] is None):
+            data = data[:,:mesh['ncol']]
+        else:
+            data = self.__gather(data, mesh['cols'], 'raster')
+        # pcolormesh keeps the array : copied from the reused buffer
+        data = np.ma.masked_invalid(data)
+
+        if (update and self.raster is not None and self.raster.get_array().shape == data.shape):
+            self.raster.set_array(data)
+            return
+
+        args = self.__raster_args(kwargs)
+        args['transform'] = mesh['transform']
+        args['shading']   = 'flat'
+
+        self.raster = self.ax.pcolormesh(mesh['x'],
+                                         mesh['y'],
+                                         data     ,
+                                         **args   )
+
+
+    # levels to BoundaryNorm and colors to ListedColormap for pcolormesh and tripcolor
+    def __raster_args(self, kwargs):
+        args   = kwargs.copy()
+        levels = args.pop('levels', None)
+        extend = args.pop('extend', 'neither')
+        colors = args.pop('colors', None)
+        if (colors is not None):
+            args['cmap'] = mcolors.ListedColormap(colors)
+        if (levels is not None and 'norm' not in args):
+            cmap = mpl.colormaps.get_cmap(args.get('cmap'))
+            args['norm'] = mcolors.BoundaryNorm(levels, ncolors=cmap.N, extend=extend)
+
+        return args
+
+
+    # Cell corners of the window for pcolormesh
+    # The corners are projected once and cached in the window, so that pcolormesh works in the coordinate of the projection.
+    # Cells of the entire longitude are rotated to start at edge_longitude, and the cell on the edge is split into two.
+    # If the cells cross the seam of the projection or leave its domain, cartopy transforms the geographic corners instead.
+    def __raster_mesh(self, window):
+        mesh = window.get('raster')
+        if (mesh is not None):
+            return mesh
+
+        lon  = window['lon']
+        lat  = window['lat']
+        cols = None
+        if (window['cyclic']):
+            # The cyclic point is not a cell
+            lon   = lon[:-1]
+            lon_c = self.__corners(lon)
+            edge  = lon_c[0] + (self.edge_longitude - lon_c[0]) % 360.
+            k     = int(np.searchsorted(lon_c, edge, side='right')) - 1
+            cols  = np.append(np.roll(np.arange(lon.size), -k), k)
+            lon_c = np.concatenate(([edge], lon_c[k+1:], lon_c[1:k+1] + 360., [edge+360.]))
+            # Slightly inside the seam
+            lon_c[ 0] += 1.E-6
+            lon_c[-1] -= 1.E-6
+        else:
+            lon_c = self.__corners(lon)
+        lat_c = np.clip(self.__corners(lat), -90., 90.)
+
+        x, y  = self.__project_mesh(lon_c, lat_c)
+        width = np.abs(np.diff(self.__proj.x_limits)[0])
+        valid = np.all(np.isfinite(x)) and np.all(np.isfinite(y)) and np.all(np.abs(np.diff(x, axis=-1)) < 0.5*width)
+        if (valid):
+            x = x.astype(self.__coord_dtype)
+            y = y.astype(self.__coord_dtype)
+            mesh = {'x': x, 'y': y, 'transform': self.__proj}
+        else:
+            mglon, mglat = self.__mesh(lon_c, lat_c)
+            mesh = {'x': mglon, 'y': mglat, 'transform': self.__crs}
+        mesh['ncol'] = lon.size
+        mesh['cols'] = cols
+        self.__window_put(window, 'raster', mesh)
+
+        return mesh
+
+
+    # Mesh of 1D lon and lat in the coordinate of the projection
+    # 1D coordinates for separable projections (x of the longitude on the equator, y of the latitude on lon=0), 2D otherwise
+    def __project_mesh(self, lon, lat):
+        if (self.__separable):
+            lon = np.asarray(lon, dtype=np.float64)
+            lat = np.asarray(lat, dtype=np.float64)
+            x   = self.__proj.transform_points(self.__crs, lon, np.zeros_like(lon))[:,0]
+            y   = self.__proj.transform_points(self.__crs, np.zeros_like(lat), lat)[:,1]
+            return x, y
+        points = self.__proj.transform_points(self.__crs, *self.__mesh(lon, lat))
+        return points[...,0], points[...,1]
+
+
+    # 2D views of 1D coordinates : no memory is allocated for the mesh
+    def __mesh(self, lon, lat):
+        shape = (np.size(lat), np.size(lon))
+        return np.broadcast_to(np.asarray(lon)[np.newaxis,:], shape), np.broadcast_to(np.asarray(lat)[:,np.newaxis], shape)
+
+
+    # Cell boundaries of 1D coordinates
+    def __corners(self, coord):
+        coord = np.asarray(coord, dtype=np.float64)
+        if (coord.size == 1):
+            return np.array([coord[0]-0.5, coord[0]+0.5])
+        mid = (coord[1:] + coord[:-1]) * 0.5
+        return np.concatenate(([2*coord[0] - mid[0]], mid, [2*coord[-1] - mid[-1]]))
+
+
+    # Interpolate the vector to the target grid with the sparse weights,
+    # and rotate it to the coordinate of the projection
+    def __regrid_vector(self, regrid, x, y):
+        shape = regrid['x'].shape
+        valid = regrid['valid']
+
+        u = regrid['matrix'] @ np.ma.filled(x, np.nan).astype(np.float64, copy=False).ravel()
+        v = regrid['matrix'] @ np.ma.filled(y, np.nan).astype(np.float64, copy=False).ravel()
+        u[~valid] = np.nan
+        v[~valid] = np.nan
+
+        u[valid], v[valid] = self.__proj.transform_vectors(self.__crs, regrid['lon'][valid], regrid['lat'][valid], u[valid], v[valid])
+
+        return u.reshape(shape), v.reshape(shape)
+
+
+    # Artist of the method : None if not plotted
+    def __artist(self, method):
+        if (method == 'contour'):
+            return self.cont
+        elif (method == 'shaded'):
+            return self.shade
+        elif (method == 'hatches'):
+            return self.hatch
+        elif (method == 'vector'):
+            return self.vector
+        elif (method == 'raster'):
+            return self.raster
+
+
+    # Stage of the profiler : no-op if the profiler is off
+    def __stage(self, name):
+        if (self.profiler is None):
+            return _NO_STAGE
+        return self.profiler.stage(name)
+
+
+    # Record the draw-time work of the artist as a stage
+    def __profile_draw(self, artist, name):
+        if (self.profiler is not None and artist is not None):
+            self.profiler.wrap_draw(artist, name)
+
+
+    # Remove the artist of the method from the axes
+    def __remove_artist(self, method):
+        if (method == 'contour'):
+            if (self.cont is not None):
+                self.cont.remove()
+            self.cont = None
+        elif (method == 'shaded'):
+            if (self.shade is not None):
+                self.shade.remove()
+            self.shade = None
+        elif (method == 'hatches'):
+            if (self.hatch is not None):
+                self.hatch.remove()
+            self.hatch = None
+        elif (method == 'vector'):
+            if (self.vector is not None):
+                self.vector.remove()
+            self.vector = None
+        elif (method == 'raster'):
+            if (self.raster is not None):
+                self.raster.remove()
+            self.raster = None
+
+
+    # Output-size mode for vector formats (PDF, SVG, EPS)
+    # The plots of the methods in rasterize are rasterized at the dpi of savefig() (dpi for to_bytes()), while the coastlines, gridlines, texts, and colorbars stay vectors.
+    # The paths of contour and shaded are simplified with the tolerance of simplify points, preserving their topology.
+    # Applied to the current plots and the following display()
+    def set_vector_output(self, rasterize=('shaded', 'hatches', 'raster'), dpi=300, simplify=None):
+        methods = ['contour', 'shaded', 'hatches', 'vector', 'raster']
+        if (rasterize is True):
+            rasterize = ('shaded', 'hatches', 'raster')
+        elif (rasterize is None or rasterize is False):
+            rasterize = ()
+        elif (isinstance(rasterize, str)):
+            rasterize = (rasterize,)
+        rasterize = tuple('raster' if (method == 'grid') else method for method in rasterize)
+        for method in rasterize:
+            if (method not in methods):
+                raise ValueError(f'Invalid method in rasterize : {method}. Options : ' + ', '.join(methods))
+        if (dpi is not None and not dpi > 0):
+            raise ValueError(f'Invalid dpi : {dpi}. Expected a positive number or None')
+        if (simplify is not None and not simplify >= 0):
+            raise ValueError(f'Invalid simplify : {simplify}. Expected a tolerance in points (>= 0) or None')
+
+        self.__output = {'rasterize': rasterize, 'dpi': dpi, 'simplify': simplify}
+        for method in methods:
+            self.__output_layer(method)
+
+
+    # Apply the output-size mode to the artist of the method
+    def __output_layer(self, method):
+        artist = self.__artist(method)
+        if (artist is None):
+            return
+
+        rasterized = (method in self.__output['rasterize'])
+        for target in (artist, getattr(artist, '_wrapped_collection_fix', None)):
+            if (target is None):
+                continue
+            if (rasterized):
+                _allow_rasterization(target)
+            target.set_rasterized(rasterized)
+
+        if (method == 'contour' or method == 'shaded'):
+            self.__simplify_contours(artist, self.__output['simplify'])
+
+
+    # Topology-preserving simplification of the contour paths in the coordinate of the projection when they are drawn
+    # tolerance is given in points, and converted with the size of the axes and the dpi of each draw (see _SimplifyEffect).
+    # Paths in the geographic coordinate (the grid crossing the edge of the map) are kept.
+    def __simplify_contours(self, artist, tolerance):
+        effects = [effect for effect in (artist.get_path_effects() or []) if (not isinstance(effect, _SimplifyEffect))]
+        if (tolerance):
+            transform = artist.get_transform()
+            if (not transform.contains_branch(self.ax.transData)):
+                return
+            source = transform - self.ax.transData
+            if (isinstance(source, InterProjectionTransform) and source.source_projection != self.__proj):
+                return
+            effects.append(_SimplifyEffect(tolerance))
+        artist.set_path_effects(effects)
+
+
     # Show colorbar
     # All arguments from matplotlib colorbar are available
     def set_cbar(self, which=None, **kwargs):
@@ -359,12 +1829,14 @@ class mapplot:
             # shaded method has higher priority
             if (self.shade is not None):
                 which = 'shaded'
+            elif (self.raster is not None):
+                which = 'raster'
             elif (self.cont is not None):
                 which = 'contour'
             else:
                 raise RuntimeError('No plotted artist to attach a colorbar to.\n'
-                                   'Call display() to draw a "shaded" (contourf) or "contour" plot first, '
-                                   'or specify which"shaded"/"contour".'
+                                   'Call display() to draw a "shaded" (contourf), "raster" (pcolormesh), or "contour" plot first, '
+                                   'or specify which"shaded"/"raster"/"contour".'
                                   )
 
         which = which.lower()
@@ -374,21 +1846,36 @@ class mapplot:
                 raise RuntimeError('Shade plot not found\n'
                                    'Call display() with method="shaded" (contourf) before set_cbar(which="shaded").'
                                   )
-            cbar = self.fig.colorbar(self.shade, ax=self.ax, **args)
+            with self.__stage('set_cbar'):
+                cbar = self.fig.colorbar(self.shade, ax=self.ax, **args)
         elif (which == 'contour'):
             # If contour, show a colorbar of contour
             if (self.cont is None):
                 raise RuntimeError('Contour plot not found\n'
                                    'Call display() with method="contour" before set_cbar(which="contour").'
                                   )
-            cbar = self.fig.colorbar(self.cont , ax=self.ax, **args)
+            with self.__stage('set_cbar'):
+                cbar = self.fig.colorbar(self.cont , ax=self.ax, **args)
+        elif (which == 'raster' or which == 'grid'):
+            # If raster, show a colorbar of pcolormesh
+            if (self.raster is None):
+                raise RuntimeError('Raster plot not found\n'
+                                   'Call display() with method="raster" before set_cbar(which="raster").'
+                                  )
+            which = 'raster'
+            with self.__stage('set_cbar'):
+                cbar = self.fig.colorbar(self.raster, ax=self.ax, **args)
         else:
-            raise ValueError('Invalid "which" for set_cbar(); expected "shaded" or "contour".')
+            raise ValueError('Invalid "which" for set_cbar(); expected "shaded", "raster", or "contour".')
 
+        self.__profile_draw(cbar.ax, 'draw.cbar')
         if (which == 'shaded'):
             self.scbar = cbar
         elif (which == 'contour'):
             self.ccbar = cbar
+        elif (which == 'raster'):
+            self.rcbar = cbar
+        self.__blit_reset()
 
 
     def set_vector_legend(self, X, Y, U=None, labelpos='S', label=None, direction='x', coordinates='axes', **kwargs):
@@ -463,6 +1950,24 @@ class mapplot:
         self.ax.set_title(title, **kwargs)
 
 
+    # Coastlines projected once and clipped to the extent of the axes when they are drawn
+    # The coastlines of the current extent are prepared here, and follow the view after pan, zoom, or ax.set_extent()
+    # The geometries are shared with the other instances through the module-level cache
+    def __set_coastlines(self):
+        if (not self.__coastline_on):
+            return
+
+        with self.__stage('coastlines'):
+            _coastline_geometries(self.__proj, self.__cl_resolution, self.ax.get_extent())
+            if (self.__coastline is None):
+                self.__coastline = self.ax.add_feature(_CoastlineFeature(self.__proj, self.__cl_resolution),
+                                                       edgecolor='black',
+                                                       facecolor='none' ,
+                                                       linewidth=0.5    ,
+                                                      )
+                self.__profile_draw(self.__coastline, 'draw.coastlines')
+
+
     # See the following website for the allowed projection:
     # https://cartopy.readthedocs.io/stable/reference/projections.html'
     def __figureProjection(self):
@@ -542,7 +2047,9 @@ class mapplot:
         lonlim = self.__toList(lonlim)
         if (lonlim[0] is None):
             # Default : All area specified to the constructor
-            if (self.edge_longitude is not None):
+            if (self.__unstructured):
+                begval, endval = self.__point_lonlim()
+            elif (self.edge_longitude is not None):
                 # Avoiding the edge_longitude comming into the plot area
                 begval = self.edge_longitude
                 endval = begval + self.lon[-1]
@@ -561,6 +2068,21 @@ class mapplot:
         self.lonlim = [vmin, vmax]
 
 
+    # Longitude range of the points : complement of the largest gap between them
+    # Points around the globe start at edge_longitude if it is known
+    def __point_lonlim(self):
+        lon  = self.__point_lon[np.isfinite(self.__point_lon)]
+        lon  = np.unique(lon % 360.)
+        gaps = np.diff(np.append(lon, lon[0]+360.))
+        gap  = np.argmax(gaps)
+        lmin = lon[(gap+1) % lon.size]
+        span = 360. - gaps[gap]
+        if (self.edge_longitude is not None and gaps[gap] < 10.):
+            lmin = self.edge_longitude
+
+        return lmin, lmin + span
+
+
     def __set_lon_check(self):
         lmin = self.lonlim[0]
         lmax = self.lonlim[1]
@@ -592,8 +2114,12 @@ class mapplot:
         latlim = self.__toList(latlim)
         if (latlim[0] is None):
             # Default : All area specified to the constructor
-            begval = self.lat[0]
-            endval = self.lat[-1]
+            if (self.__unstructured):
+                begval = np.nanmin(self.__point_lat)
+                endval = np.nanmax(self.__point_lat)
+            else:
+                begval = self.lat[0]
+                endval = self.lat[-1]
             if (begval < endval):
                 vmin = begval
                 vmax = endval
@@ -617,15 +2143,267 @@ class mapplot:
         self.latlim = [vmin, vmax]
 
 
-    def __select_level(self, data):
-        if (data.ndim == 1 or data.ndim > 3):
+    # Index of the selected level : () for 2D data
+    def __level_index(self, data):
+        if (data.ndim == 4):
+            raise ValueError(f'Invalid data shape for display(): 4D (time, lev, lat, lon) data needs "reduce", got {data.shape}.')
+        elif (data.ndim == 1 or data.ndim > 3):
             raise ValueError(f'Invalid data shape for display(): expected 2D (lat, lon) or 3D (lev, lat, lon), got {data.shape}.')
         elif (data.ndim == 2):
-            data_pass = data[:,:]
+            return ()
         elif (data.ndim == 3):
-            data_pass = data[self.levidx,:,:]
+            return (self.levidx,)
+
+
+    # Read the window of the selected level
+    # ndarray (including np.memmap) is indexed as views until the window is gathered.
+    # The other array-likes (xarray.DataArray, netCDF4, h5py, zarr, ...) are indexed with slices only,
+    # so that only the selected level and the window are read into memory.
+    def __read_window(self, data, window, role):
+        if (not hasattr(data, 'ndim') or not hasattr(data, '__getitem__')):
+            data = np.asarray(data)
+        lev = self.__level_index(data)
+
+        if (isinstance(data, np.ndarray)):
+            return self.__crop(data[lev], window, role)
+
+        lonidx = window['lonidx']
+        if (isinstance(lonidx, slice)):
+            return self.__materialize(data[lev + (window['latidx'], lonidx)])
+
+        # Wrapped window : read the contiguous runs of longitude indices
+        unique = np.unique(lonidx)
+        breaks = np.where(np.diff(unique) != 1)[0] + 1
+        blocks = [self.__materialize(data[lev + (window['latidx'], slice(int(run[0]), int(run[-1])+1))])
+                  for run in np.split(unique, breaks)]
+        if (any(np.ma.isMaskedArray(block) for block in blocks)):
+            block = np.ma.concatenate(blocks, axis=1)
+        else:
+            block = np.concatenate(blocks, axis=1)
+
+        return self.__gather(block, np.searchsorted(unique, lonidx), role)
+
+
+    # Window of data, or of its reduction over time if reduce is given (see _reduce_spec())
+    def __read_field(self, data, window, role, reduce):
+        if (reduce is None):
+            return self.__read_window(data, window, role)
+
+        if (not hasattr(data, 'ndim') or not hasattr(data, '__getitem__')):
+            data = np.asarray(data)
+        if (data.ndim not in (3, 4) or data.shape[-2:] != (self.lat.size, self.lon.size)):
+            raise ValueError(f'Invalid data shape for display() with "reduce": expected 3D (time, lat, lon) or 4D (time, lev, lat, lon) with (lat, lon) = {(self.lat.size, self.lon.size)}, got {data.shape}.')
+        lev = (self.levidx,) if (data.ndim == 4) else ()
+
+        # Rows of the window are read for the time steps t0:t1
+        latidx = window['latidx']
+        lonidx = window['lonidx']
+        shape  = (latidx.stop - latidx.start, window['lon'].size)
+        def read(t0, t1, rows):
+            index = (slice(t0, t1),) + lev + (slice(latidx.start + rows.start, latidx.start + rows.stop),)
+            if (isinstance(lonidx, slice)):
+                block = self.__materialize(data[index + (lonidx,)])
+            elif (isinstance(data, np.ndarray)):
+                block = data[index][..., lonidx]
+            else:
+                unique = np.unique(lonidx)
+                breaks = np.where(np.diff(unique) != 1)[0] + 1
+                blocks = [self.__materialize(data[index + (slice(int(run[0]), int(run[-1])+1),)])
+                          for run in np.split(unique, breaks)]
+                block  = np.ma.concatenate(blocks, axis=-1)[..., np.searchsorted(unique, lonidx)]
+            return _nan_filled(block)
+
+        climatology = None
+        if (reduce['op'] == 'anomaly'):
+            climatology = reduce['climatology'][0 if (role == 'x') else 1] if (self.method == 'vector') else reduce['climatology']
+            climatology = _nan_filled(self.__read_window(climatology, window, 'climatology'))
+
+        with self.__stage('display.reduce'):
+            result = _reduce_time(read, data.shape[0], shape, reduce, climatology)
+        # Vectors take NaN for the missing values (see __apply_mask())
+        return result if (self.method == 'vector') else np.ma.masked_invalid(result)
+
+
+    # Reduction over time of the values at the points of the triangulation
+    # Data is (time,) + lon.shape or (time, lev) + lon.shape, read for the time steps t0:t1
+    def __reduce_points(self, data, entry, reduce, component):
+        if (not hasattr(data, 'ndim') or not hasattr(data, '__getitem__')):
+            data = np.asarray(data)
+        if (data.ndim not in (self.lon.ndim + 1, self.lon.ndim + 2) or data.shape[data.ndim - self.lon.ndim:] != self.lon.shape):
+            raise ValueError(f'Invalid data shape for display() with "reduce": expected (time,)+{self.lon.shape} or (time, lev)+{self.lon.shape} for grid="{self.grid}", got {data.shape}.')
+        lev   = (self.levidx,) if (data.ndim == self.lon.ndim + 2) else ()
+        index = entry['index']
+
+        def read(t0, t1, part):
+            block = self.__materialize(data[(slice(t0, t1),) + lev])
+            return _nan_filled(block.reshape(t1 - t0, -1)[:, index[part]])
+
+        climatology = None
+        if (reduce['op'] == 'anomaly'):
+            climatology = reduce['climatology'][component] if (self.method == 'vector') else reduce['climatology']
+            climatology = _nan_filled(self.__read_points(climatology, entry))
+
+        with self.__stage('display.reduce'):
+            return _reduce_time(read, data.shape[0], (index.size,), reduce, climatology)
+
+
+    # Array-like to ndarray : masked arrays are kept
+    def __materialize(self, data):
+        if (isinstance(data, np.ndarray)):
+            return data
+        return np.asarray(data)
+
+
+    # Index window of the plotted area including the halo
+    # Windows are cached for each extent of the axes, so that repeated display() reuse them
+    def __get_window(self):
+        key    = self.ax.get_xlim() + self.ax.get_ylim()
+        window = self.__windows.get(key)
+        if (window is None):
+            lmin, lmax, smin, smax = self.__visible_bounds(*key)
+            window = {'key': key, 'bounds': (lmin, lmax, smin, smax)}
+            # Curvilinear grids and points have the bounds only : the points are selected by the triangulation
+            if (not self.__unstructured):
+                window['lonidx'], window['lon'] = self.__window_lon(lmin, lmax)
+                window['latidx'], window['lat'] = self.__window_lat(smin, smax)
+                window['mglon'] , window['mglat'] = self.__mesh(window['lon'], window['lat'])
+                window['cyclic'] = (window['lonidx'] is self.__wrap)
+            self.__windows.put(key, window, _nbytes(window))
+
+        return window
+
+
+    # Store an entry in the window (or in a reduced window of "lod"), and count the bytes of the window again
+    # The least recently used windows are discarded when their projected meshes exceed maxbytes of the window cache
+    def __window_put(self, window, name, value):
+        window[name] = value
+        top = self.__windows.get(window['key'])
+        if (top is not None):
+            self.__windows.put(window['key'], top, _nbytes(top))
+
+
+    # Longitude and latitude range visible in the axes rectangle [x0, x1] x [y0, y1]
+    # Equal to lonlim and latlim for cylindrical projections,
+    # but the rectangle covers a wider area for the other projections.
+    def __visible_bounds(self, x0, x1, y0, y1):
+        edge  = np.linspace(0., 1., 257)
+        inner = np.linspace(0., 1., 33)
+        zeros = np.zeros_like(edge)
+        ones  = np.ones_like(edge)
+        u = np.concatenate([edge , edge, zeros, ones, np.repeat(inner, inner.size)])
+        v = np.concatenate([zeros, ones, edge , edge, np.tile(inner, inner.size)  ])
+        points = self.__crs.transform_points(self.__proj, x0 + (x1-x0)*u, y0 + (y1-y0)*v)
+        lon    = points[:,0]
+        lat    = points[:,1]
+        valid  = np.isfinite(lon) & np.isfinite(lat)
+        if (not np.any(valid)):
+            return self.lonlim[0], self.lonlim[1], self.latlim[0], self.latlim[1]
+        lon = lon[valid]
+        lat = lat[valid]
+
+        # Longitude range : complement of the largest gap between the visible longitudes
+        lon  = np.sort(lon % 360.)
+        gaps = np.diff(np.append(lon, lon[0]+360.))
+        gap  = np.argmax(gaps)
+        lmin = lon[(gap+1) % lon.size]
+        lmax = lmin + 360. - gaps[gap]
+        smin = lat.min()
+        smax = lat.max()
+
+        # A pole in the rectangle : all longitudes are visible
+        for pole in (-90., 90.):
+            p0 = self.__proj.transform_point(  0., pole, self.__crs)
+            p1 = self.__proj.transform_point(180., pole, self.__crs)
+            if (np.all(np.isfinite(p0)) and np.allclose(p0, p1) and x0 <= p0[0] <= x1 and y0 <= p0[1] <= y1):
+                lmin = 0.
+                lmax = 360.
+                smin = min(smin, pole)
+                smax = max(smax, pole)
+
+        # Margin for the sampling of the rectangle
+        dlon = (lmax - lmin) * 0.01
+        dlat = (smax - smin) * 0.01
+        return lmin-dlon, lmax+dlon, smin-dlat, smax+dlat
+
+
+    # Longitude indices of the data covering [lmin, lmax]
+    # The indices wrap around the seam of the data, and the longitudes are unwrapped to be monotonic
+    # A slice is returned if the indices are contiguous, so that the window is a view of the data
+    def __window_lon(self, lmin, lmax):
+        nlon = self.lon.size
+        halo = self.__halo
+
+        angle  = (self.lon - lmin) % 360.
+        start  = np.argmin(angle)                        # First grid point east of the western limit
+        count  = np.count_nonzero(angle <= lmax - lmin)  # Grid points in the plotted area
+        if (self.__cyclic and count + 2*halo >= nlon):
+            # Entire longitude : the cyclic point is included
+            return self.__wrap, self.lon_cycle
+
+        idx = np.arange(start-halo, start+count+halo)
+        if (self.__cyclic):
+            idx = idx % nlon
+        else:
+            idx = idx[(idx >= 0) & (idx < nlon)]
+
+        lon = self.lon[idx].astype(np.float64)
+        lon = lon[0] + np.concatenate(([0.], np.cumsum(np.diff(lon) % 360.)))
+        # Same 360-degree branch as lonlim
+        ref = lon[np.argmax(idx == start)]
+        lon = lon + 360. * np.round((lmin - ref) / 360.)
+
+        if (np.all(np.diff(idx) == 1)):
+            idx = slice(int(idx[0]), int(idx[-1])+1)
+
+        return idx, lon
+
+
+    # Latitude slice covering [smin, smax] : both ascending and descending latitudes are accepted
+    def __window_lat(self, smin, smax):
+        nlat = self.lat.size
+        halo = self.__halo
+
+        ascending = (self.lat[0] <= self.lat[-1])
+        if (ascending):
+            lat = self.lat
+        else:
+            lat = self.lat[::-1]
+
+        j0 = max(int(np.searchsorted(lat, smin, side='left' )) - halo, 0   )
+        j1 = min(int(np.searchsorted(lat, smax, side='right')) + halo, nlat)
+        if (not ascending):
+            j0, j1 = nlat - j1, nlat - j0
+
+        return slice(j0, j1), self.lat[j0:j1]
+
+
+    # Cut out the window from the data
+    # Contiguous windows are returned as views.
+    # Wrapped windows are gathered into a buffer preallocated for each role ('x' or 'y'),
+    # so that steady-state rendering does not allocate a new array for every call.
+    def __crop(self, data, window, role):
+        data_pass = data[window['latidx'],:]
+        lonidx    = window['lonidx']
+        if (isinstance(lonidx, slice)):
+            return data_pass[:,lonidx]
+
+        return self.__gather(data_pass, lonidx, role)
+
+
+    # Gather the columns lonidx of 2D data into the buffer of the role
+    def __gather(self, data, lonidx, role):
+        if (np.ma.isMaskedArray(data)):
+            # Mask must be kept : no buffer
+            return data[:,lonidx]
 
-        return data_pass
+        shape  = (data.shape[0], lonidx.size)
+        buffer = self.__buffers.get(role)
+        if (buffer is None or buffer.shape != shape or buffer.dtype != data.dtype):
+            buffer = np.empty(shape, dtype=data.dtype)
+            self.__buffers[role] = buffer
+        np.take(data, lonidx, axis=1, out=buffer, mode='clip')
+
+        return buffer
 
 
     # Set tick positions
@@ -701,3 +2479,1700 @@ class mapplot:
                                                         )
 
 
+# Grid of mapplot panels (small multiples) sharing one grid, projection, window cache, and coastline geometries
+# Panels are created in the row-major order, and count (if given) limits the number of panels.
+# Indexing and iteration give the mapplot of each panel.
+class mappanels:
+
+    def __init__(self, fig, nrows, ncols, lon, lat, count=None, **kwargs):
+        if (count is None):
+            count = nrows * ncols
+        if (count < 1 or count > nrows*ncols):
+            raise ValueError(f'Invalid count : {count}. Expected 1 <= count <= nrows*ncols = {nrows*ncols}')
+
+        # All panels on one figure without pyplot
+        if (fig is None):
+            fig = Figure()
+            FigureCanvasAgg(fig)
+
+        self.fig    = fig
+        self.nrows  = nrows
+        self.ncols  = ncols
+        self.panels = [mapplot(fig, [nrows, ncols, 1], lon, lat, **kwargs)]
+        for idx in range(2, count+1):
+            self.panels.append(mapplot(fig, [nrows, ncols, idx], lon, lat, share=self.panels[0], **kwargs))
+        self.cbar   = None      # Colorbar shared by the panels
+
+
+    def __len__(self):
+        return len(self.panels)
+
+
+    def __getitem__(self, idx):
+        return self.panels[idx]
+
+
+    def __iter__(self):
+        return iter(self.panels)
+
+
+    def gxout(self, method, cmap=None, colors=None):
+        for panel in self.panels:
+            panel.gxout(method, cmap=cmap, colors=colors)
+
+
+    # Plot a stack of data : data[i] (and y[i]) is plotted on the i-th panel
+    # If levels are omitted for contour, shaded, and raster, common levels are chosen from the range of the stack,
+    # so that the panels can share a colorbar.
+    def display(self, data, y=None, **kwargs):
+        if (len(data) > len(self.panels)):
+            raise ValueError(f'Too many panels in data : {len(data)}. This grid has {len(self.panels)} panels')
+        if (y is not None and len(y) != len(data)):
+            raise ValueError(f'data and y must have the same number of panels : {len(data)} and {len(y)}')
+
+        if (self.panels[0].method in ('contour', 'shaded', 'raster') and 'levels' not in kwargs):
+            if (kwargs.get('reduce') is not None):
+                raise TypeError('mappanels.display() needs argument "levels" with "reduce"')
+            vmin = np.nanmin(data)
+            vmax = np.nanmax(data)
+            kwargs['levels'] = mticker.MaxNLocator(nbins=10).tick_values(vmin, vmax)
+
+        for i in range(len(data)):
+            self.panels[i].display(data[i], y=None if (y is None) else y[i], **kwargs)
+
+
+    # Tick labels only on the left column and the bottom row if outer=True
+    def set_label(self, x=None, y=None, outer=True, **kwargs):
+        for i, panel in enumerate(self.panels):
+            panel.set_label(x=x, y=y, **kwargs)
+            if (outer):
+                panel.gridlines.left_labels   = (i % self.ncols == 0)
+                # The last panel of each column has the bottom labels
+                panel.gridlines.bottom_labels = (i + self.ncols >= len(self.panels))
+                # Labels along the boundary of non-rectangular maps and inside the maps are also removed from inner panels
+                # Placing them is the most part of drawing the gridliner
+                if (not (panel.gridlines.left_labels or panel.gridlines.bottom_labels)):
+                    panel.gridlines.geo_labels    = False
+                    panel.gridlines.inline_labels = False
+
+
+    # One colorbar for all panels
+    # All arguments from matplotlib colorbar are available
+    def set_cbar(self, which=None, **kwargs):
+        defaults = {'location': 'bottom', 'shrink': 0.9, 'aspect': 40, 'pad': 0.08}
+        args     = defaults.copy()
+        args.update(kwargs)
+        if (('pad' not in kwargs) and (args['location']=='right' or args['location']=='left')):
+            args['pad'] = 0.03
+
+        first = self.panels[0]
+        if (which is None):
+            which = 'shaded' if (first.shade is not None) else 'raster' if (first.raster is not None) else 'contour'
+        which = which.lower()
+        if (which == 'grid'):
+            which = 'raster'
+        if (which not in ('shaded', 'raster', 'contour')):
+            raise ValueError('Invalid "which" for set_cbar(); expected "shaded", "raster", or "contour".')
+
+        mappable = {'shaded': first.shade, 'raster': first.raster, 'contour': first.cont}[which]
+        if (mappable is None):
+            raise RuntimeError('No plotted artist to attach a colorbar to.\n'
+                               'Call display() to draw a "shaded" (contourf), "raster" (pcolormesh), or "contour" plot first.'
+                              )
+        self.cbar = self.fig.colorbar(mappable, ax=[panel.ax for panel in self.panels], **args)
+
+        return self.cbar
+
+
+    # Titles of the panels : a list of strings, or a format string with {index} (from 0)
+    def set_title(self, titles, **kwargs):
+        if (isinstance(titles, str)):
+            titles = [titles.format(index=i) for i in range(len(self.panels))]
+        for panel, title in zip(self.panels, titles):
+            panel.set_title(title, **kwargs)
+
+
+    def set_vector_output(self, **kwargs):
+        for panel in self.panels:
+            panel.set_vector_output(**kwargs)
+
+
+# Dictionary discarding the least recently used item beyond maxsize
+# Least recently used items are discarded when the number of items exceeds maxsize,
+# or the total size given to put() exceeds maxbytes (if not None)
+class _LRUCache:
+
+    def __init__(self, maxsize, maxbytes=None):
+        self.maxsize  = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes   = 0
+        self.__items  = collections.OrderedDict()
+        self.__sizes  = {}
+        self.__lock   = threading.RLock()     # Module-level caches are shared by the threads
+
+
+    def __len__(self):
+        return len(self.__items)
+
+
+    def get(self, key, default=None):
+        with self.__lock:
+            if (key not in self.__items):
+                return default
+            self.__items.move_to_end(key)
+            return self.__items[key]
+
+
+    def put(self, key, value, nbytes=0):
+        with self.__lock:
+            self.nbytes += nbytes - self.__sizes.get(key, 0)
+            self.__items[key] = value
+            self.__sizes[key] = nbytes
+            self.__items.move_to_end(key)
+            while (len(self.__items) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                old, value = self.__items.popitem(last=False)
+                self.nbytes -= self.__sizes.pop(old)
+
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+            self.__sizes.clear()
+            self.nbytes = 0
+
+
+# Bytes of the arrays in nested dictionaries, lists, and tuples
+# Views broadcast along an axis (stride 0) count the memory of the axis once
+def _nbytes(value):
+    if (isinstance(value, np.ndarray)):
+        return value.itemsize * int(np.prod([n for n, stride in zip(value.shape, value.strides) if (stride != 0)]))
+    if (isinstance(value, dict)):
+        return sum(_nbytes(v) for v in value.values())
+    if (isinstance(value, (list, tuple))):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+# Wall time and allocated bytes of named stages
+# Totals are accumulated for each stage name, and each record is passed to the callbacks as
+#   {'stage': name, 'seconds': wall time, 'bytes': net allocation (None unless tracemalloc is tracing)}
+# memory=True starts tracemalloc, which slows down the allocations, until close(); the wall time alone is cheap.
+class _StageProfiler:
+
+    def __init__(self, memory=False, verbose=False):
+        self.stages    = collections.OrderedDict()
+        self.callbacks = []
+        self.verbose   = verbose
+        self.__tracing = None
+        if (memory):
+            _tracemalloc_acquire()
+            self.__tracing = weakref.finalize(self, _tracemalloc_release)
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if (tracing):
+            memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            nbytes  = tracemalloc.get_traced_memory()[0] - memory if (tracing) else None
+            self.record(name, seconds, nbytes)
+
+
+    def record(self, name, seconds, nbytes=None):
+        total = self.stages.get(name)
+        if (total is None):
+            total = {'calls': 0, 'seconds': 0., 'bytes': None}
+            self.stages[name] = total
+        total['calls']   += 1
+        total['seconds'] += seconds
+        if (nbytes is not None):
+            total['bytes'] = (total['bytes'] or 0) + nbytes
+
+        if (self.verbose):
+            memory = f' {nbytes/2.**20:+9.2f} MiB' if (nbytes is not None) else ''
+            print(f'mapplot : {name:<24} {seconds*1.E3:10.2f} ms{memory}')
+        if (self.callbacks):
+            event = {'stage': name, 'seconds': seconds, 'bytes': nbytes}
+            for callback in self.callbacks:
+                callback(event)
+
+
+    # Time the draw() of the artist : called by matplotlib for each draw of the figure
+    def wrap_draw(self, artist, name):
+        if ('draw' in vars(artist)):
+            return
+        draw = artist.draw
+        def profiled_draw(renderer, *args, **kwargs):
+            with self.stage(name):
+                return draw(renderer, *args, **kwargs)
+        artist.draw = profiled_draw
+
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+
+    def reset(self):
+        self.stages.clear()
+
+
+    # Stop tracemalloc if this profiler started it and no other profiler uses it (also done when the profiler is collected)
+    # The following stages record the wall time only
+    def close(self):
+        if (self.__tracing is not None):
+            self.__tracing()
+
+
+    def to_dict(self):
+        return {name: dict(total) for name, total in self.stages.items()}
+
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+# tracemalloc of the profilers with memory=True : started by the first of them unless it is already tracing,
+# and stopped when the last of them is closed or collected, so that the allocations of the process are not slowed down afterward
+_TRACEMALLOC      = {'users': 0, 'started': False}
+_TRACEMALLOC_LOCK = threading.Lock()
+def _tracemalloc_acquire():
+    with _TRACEMALLOC_LOCK:
+        if (_TRACEMALLOC['users'] == 0 and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            _TRACEMALLOC['started'] = True
+        _TRACEMALLOC['users'] += 1
+
+
+def _tracemalloc_release():
+    with _TRACEMALLOC_LOCK:
+        _TRACEMALLOC['users'] -= 1
+        if (_TRACEMALLOC['users'] == 0 and _TRACEMALLOC['started']):
+            tracemalloc.stop()
+            _TRACEMALLOC['started'] = False
+
+
+# cartopy keeps one interpolator for each pair of (source CRS, projection) in a process-wide lru_cache,
+# and the interpolator holds the state of the line being projected.
+# Threads drawing equal projections at the same time would share it, so set_thread_rendering() makes the cache thread-local.
+# The hook (cartopy.trace._interpolator) is private to cartopy : checked with cartopy 0.24.
+# With the other versions, or if the hook is not an lru_cache of a function, nothing is replaced and a warning is issued
+_THREAD_RENDERING_VERSIONS = ('0.24',)
+_INTERPOLATORS             = threading.local()
+def _thread_interpolator(src_crs, dest_projection):
+    cache = getattr(_INTERPOLATORS, 'cache', None)
+    if (cache is None):
+        cache = _INTERPOLATORS.cache = functools.lru_cache(maxsize=4)(_thread_interpolator.original)
+    return cache(src_crs, dest_projection)
+
+
+# Replace cartopy's process-wide interpolator cache with a thread-local one (enable=True), or restore it (enable=False)
+# Call it before rendering from multiple threads. Returns True if the thread-local cache is in use
+def set_thread_rendering(enable=True):
+    current = getattr(ctrace, '_interpolator', None)
+    if (not enable):
+        if (current is _thread_interpolator):
+            ctrace._interpolator = _thread_interpolator.cached
+        return False
+    if (current is _thread_interpolator):
+        return True
+
+    version = '.'.join(cartopy.__version__.split('.')[:2])
+    if (version not in _THREAD_RENDERING_VERSIONS):
+        reason = f'set_thread_rendering() was checked with cartopy {", ".join(_THREAD_RENDERING_VERSIONS)}, not {cartopy.__version__}'
+    elif (current is None):
+        reason = 'cartopy.trace._interpolator was not found in this version of cartopy'
+    elif (not (callable(getattr(current, '__wrapped__', None)) and hasattr(current, 'cache_clear'))):
+        reason = 'cartopy.trace._interpolator is not a cached function in this version of cartopy'
+    else:
+        reason = None
+    if (reason is not None):
+        warnings.warn(f'{reason}: the interpolators are not made thread-local, '
+                      'and maps of equal projections drawn at the same time by threads may be wrong', UserWarning)
+        return False
+    _thread_interpolator.original = current.__wrapped__
+    _thread_interpolator.cached   = current
+    ctrace._interpolator          = _thread_interpolator
+    return True
+
+
+# Coastlines projected to a projection (full globe) and clipped to an extent
+_COASTLINES = _LRUCache(16)
+
+
+# Change the number of coastline geometries kept in the cache
+# maxsize=0 disables the cache
+def set_coastline_cache(maxsize=16):
+    _COASTLINES.maxsize = maxsize
+    _COASTLINES.clear()
+
+
+# Coastline geometries in the coordinate of projection, clipped to extent=(x0, x1, y0, y1), or the entire globe if extent=None
+# Both the projected globe and the clipped geometries are cached for each (projection, scale, extent)
+def _coastline_geometries(projection, scale, extent):
+    projected = _COASTLINES.get((projection, scale))
+    if (projected is None):
+        geometries = [projection.project_geometry(geometry, ccrs.PlateCarree())
+                      for geometry in cfeature.COASTLINE.with_scale(scale).geometries()]
+        geometries = [geometry for geometry in geometries if (not geometry.is_empty)]
+        projected  = (geometries, shapely.STRtree(geometries))
+        _COASTLINES.put((projection, scale), projected)
+    if (extent is None):
+        return projected[0]
+
+    x0, x1, y0, y1 = extent
+    key     = (projection, scale, round(x0, 6), round(x1, 6), round(y0, 6), round(y1, 6))
+    clipped = _COASTLINES.get(key)
+    if (clipped is not None):
+        return clipped
+
+    # Margin of 1 percent avoids cutting the lines at the frame
+    dx = (x1 - x0) * 0.01
+    dy = (y1 - y0) * 0.01
+    box        = shapely.box(x0-dx, y0-dy, x1+dx, y1+dy)
+    geometries = [projected[0][i].intersection(box) for i in projected[1].query(box)]
+    clipped    = [geometry for geometry in geometries if (not geometry.is_empty)]
+    _COASTLINES.put(key, clipped)
+
+    return clipped
+
+
+# Coastlines in the coordinate of projection for cartopy's FeatureArtist
+# The geometries are clipped to the extent of the axes at each draw and cached for each extent by _coastline_geometries()
+class _CoastlineFeature(cfeature.Feature):
+    def __init__(self, projection, scale):
+        super().__init__(projection)
+        self.scale = scale
+
+
+    def geometries(self):
+        return iter(_coastline_geometries(self.crs, self.scale, None))
+
+
+    def intersecting_geometries(self, extent):
+        if (extent is None or np.isnan(extent[0])):
+            return self.geometries()
+        return iter(_coastline_geometries(self.crs, self.scale, extent))
+
+
+# Paths of contour() and contourf() : in memory and optionally in a directory
+# Disabled until set_contour_cache() is called : hashing the data costs time when the fields never repeat
+# 'total' is the size of the files in the directory : counted once and updated by _contour_put()
+_CONTOURS          = _LRUCache(4096, maxbytes=0)
+_CONTOUR_DISK      = {'directory': None, 'maxbytes': 2**30, 'total': None}
+_CONTOUR_DISK_LOCK = threading.Lock()
+
+# The cached paths are replayed through the internals of QuadContourSet (see _contour_proxy())
+# Checked with matplotlib 3.10. With the other versions, contour() and contourf() are called as usual and nothing is cached
+_CONTOUR_REPLAY_VERSIONS = ('3.10',)
+_CONTOUR_REPLAY          = {'enabled': '.'.join(mpl.__version__.split('.')[:2]) in _CONTOUR_REPLAY_VERSIONS}
+
+
+# The replay did not work with this matplotlib : disabled for the process with a warning
+def _contour_replay_failed(error):
+    if (_CONTOUR_REPLAY['enabled']):
+        _CONTOUR_REPLAY['enabled'] = False
+        warnings.warn(f'Cached contours could not be replayed with matplotlib {mpl.__version__} ({error}). '
+                      'The contour cache is disabled', UserWarning)
+
+
+# Enable the contour cache, or change its size, and clear it
+# maxbytes=0 and directory=None disable the cache
+def set_contour_cache(maxbytes=64*2**20, directory=None, disk_maxbytes=2**30):
+    _CONTOURS.maxbytes = maxbytes
+    _CONTOURS.clear()
+    if (directory is not None):
+        os.makedirs(directory, exist_ok=True)
+    with _CONTOUR_DISK_LOCK:
+        _CONTOUR_DISK['directory'] = directory
+        _CONTOUR_DISK['maxbytes']  = disk_maxbytes
+        _CONTOUR_DISK['total']     = None
+
+
+# Hash of everything the projected paths depend on : projection, data, grid, levels, and the contour options
+# None if the cache is disabled or the levels depend on an object (locator, log scale)
+def _contour_key(projection, lon, lat, data, filled, kwargs):
+    if (not _CONTOUR_REPLAY['enabled']):
+        return None
+    if (_CONTOURS.maxbytes == 0 and _CONTOUR_DISK['directory'] is None):
+        return None
+    if ('locator' in kwargs or isinstance(kwargs.get('norm'), mcolors.LogNorm)):
+        return None
+
+    corner_mask = kwargs.get('corner_mask', None)
+    algorithm   = kwargs.get('algorithm'  , None)
+    if (algorithm is None):
+        algorithm = mpl.rcParams['contour.algorithm']
+    if (corner_mask is None and algorithm != 'mpl2005'):
+        corner_mask = mpl.rcParams['contour.corner_mask']
+    options = (filled, kwargs.get('extend', 'neither'), corner_mask, algorithm, kwargs.get('nchunk', 0), data.shape, str(data.dtype))
+
+    levels = kwargs.get('levels', None)
+    digest = hashlib.blake2b(repr(options).encode(), digest_size=20)
+    digest.update(projection.srs.encode())
+    if (levels is None or np.isscalar(levels)):
+        digest.update(repr(levels).encode())
+    else:
+        digest.update(np.asarray(levels, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(lon, dtype=np.float64).data)
+    digest.update(np.ascontiguousarray(lat, dtype=np.float64).data)
+    digest.update(np.ascontiguousarray(np.ma.getdata(data)).data)
+    if (np.ma.isMaskedArray(data)):
+        digest.update(np.ascontiguousarray(np.ma.getmaskarray(data)).data)
+
+    return digest.hexdigest()
+
+
+def _contour_get(key):
+    entry = _CONTOURS.get(key)
+    if (entry is not None or _CONTOUR_DISK['directory'] is None):
+        return entry
+
+    path = os.path.join(_CONTOUR_DISK['directory'], key + '.npz')
+    try:
+        with np.load(path) as f:
+            count = int(f['count'])
+            entry = {'levels'     : f['levels']           ,
+                     'zmin'       : float(f['zmin'])      ,
+                     'zmax'       : float(f['zmax'])      ,
+                     'mins'       : list(f['mins'])       ,
+                     'maxs'       : list(f['maxs'])       ,
+                     'corner_mask': f['corner_mask'].item(),
+                     'algorithm'  : str(f['algorithm'])   ,
+                     'vertices'   : [f[f'v{i}'] for i in range(count)],
+                     'codes'      : [f[f'c{i}'] for i in range(count)],
+                    }
+        os.utime(path)      # Most recently used
+    except (OSError, KeyError, ValueError):
+        return None
+
+    _CONTOURS.put(key, entry, _contour_nbytes(entry))
+    return entry
+
+
+def _contour_put(key, entry):
+    _CONTOURS.put(key, entry, _contour_nbytes(entry))
+
+    directory = _CONTOUR_DISK['directory']
+    if (directory is None):
+        return
+
+    count  = len(entry['vertices'])
+    arrays = {'count'      : count              ,
+              'levels'     : entry['levels']    ,
+              'zmin'       : entry['zmin']      ,
+              'zmax'       : entry['zmax']      ,
+              'mins'       : entry['mins']      ,
+              'maxs'       : entry['maxs']      ,
+              'corner_mask': entry['corner_mask'],
+              'algorithm'  : entry['algorithm'] ,
+             }
+    for i in range(count):
+        arrays[f'v{i}'] = entry['vertices'][i]
+        arrays[f'c{i}'] = entry['codes'][i]
+    path = os.path.join(directory, key + '.npz')
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            np.savez(f, **arrays)
+            size = f.tell()
+        os.replace(temp, path)
+    except OSError as e:
+        warnings.warn(f'Contour cache could not be written to {directory} : {e}', UserWarning)
+        return
+
+    # The directory is listed only when the total counted so far exceeds maxbytes (or is not counted yet)
+    # Files written by the other processes are counted at that time
+    with _CONTOUR_DISK_LOCK:
+        if (_CONTOUR_DISK['total'] is not None):
+            _CONTOUR_DISK['total'] += size
+            if (_CONTOUR_DISK['total'] <= _CONTOUR_DISK['maxbytes']):
+                return
+        _CONTOUR_DISK['total'] = _contour_evict(directory)
+
+
+# Remove the least recently used files until the directory fits in maxbytes : returns the total size of the remaining files
+def _contour_evict(directory):
+    files = []
+    for name in os.listdir(directory):
+        if (name.endswith('.npz')):
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for mtime, size, name in files)
+    for mtime, size, name in sorted(files):
+        if (total <= _CONTOUR_DISK['maxbytes']):
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+        total -= size
+
+    return total
+
+
+def _contour_nbytes(entry):
+    return sum(v.nbytes for v in entry['vertices']) + sum(c.nbytes for c in entry['codes'])
+
+
+# QuadContourSet accepted by contour()/contourf() in place of X, Y, Z
+# matplotlib takes the levels, the data range, and the contour generator from it
+def _contour_proxy(entry):
+    proxy = object.__new__(mcontour.QuadContourSet)
+    proxy.levels             = entry['levels']
+    proxy.zmin               = entry['zmin']
+    proxy.zmax               = entry['zmax']
+    proxy._mins              = entry['mins']
+    proxy._maxs              = entry['maxs']
+    proxy._corner_mask       = entry['corner_mask']
+    proxy._algorithm         = entry['algorithm']
+    proxy._contour_generator = _ContourReplay(entry)
+    return proxy
+
+
+# Contour generator returning the cached paths in the order matplotlib asks for the levels
+# complete() is False unless matplotlib asked for each cached path exactly once : the caller falls back to contour()
+class _ContourReplay:
+
+    def __init__(self, entry):
+        self.__vertices = entry['vertices']
+        self.__codes    = entry['codes']
+        self.__count    = 0
+
+
+    def create_contour(self, level):
+        return self.__next()
+
+
+    def create_filled_contour(self, lower, upper):
+        return self.__next()
+
+
+    def complete(self):
+        return self.__count == len(self.__vertices)
+
+
+    def __next(self):
+        if (self.__count >= len(self.__vertices)):
+            raise IndexError('matplotlib asked for more levels than the cached contours have')
+        vertices = self.__vertices[self.__count]
+        codes    = self.__codes[self.__count]
+        self.__count += 1
+        if (len(vertices) == 0):
+            return [], []
+        return [vertices], [codes]
+
+
+# Triangulations of curvilinear grids and points : in memory and optionally in a directory
+_TRIANGULATIONS     = _LRUCache(16)
+_TRIANGULATION_DISK = {'directory': None}
+
+
+# Change the number of triangulations kept in memory and clear them
+# directory=None disables the cache on disk
+def set_triangulation_cache(maxsize=16, directory=None):
+    _TRIANGULATIONS.maxsize = maxsize
+    _TRIANGULATIONS.clear()
+    if (directory is not None):
+        os.makedirs(directory, exist_ok=True)
+    _TRIANGULATION_DISK['directory'] = directory
+
+
+# Land of the data grids rasterized from Natural Earth : bit-packed, in memory and optionally in a directory
+_MASKS     = _LRUCache(8)
+_MASK_DISK = {'directory': None}
+
+
+# Change the number of land masks kept in memory and clear them
+# directory=None disables the cache on disk
+def set_mask_cache(maxsize=8, directory=None):
+    _MASKS.maxsize = maxsize
+    _MASKS.clear()
+    if (directory is not None):
+        os.makedirs(directory, exist_ok=True)
+    _MASK_DISK['directory'] = directory
+
+
+# True on land for each grid point : (lat, lon) for a regular grid, the shape of lon otherwise
+# Cached for each (grid, scale) as the bits packed by np.packbits
+def _land_mask(lon, lat, scale, regular=True):
+    shape  = (lat.size, lon.size) if regular else lon.shape
+    digest = hashlib.blake2b(repr((scale, regular, lon.shape, lat.shape)).encode(), digest_size=20)
+    digest.update(np.ascontiguousarray(lon, dtype=np.float64).data)
+    digest.update(np.ascontiguousarray(lat, dtype=np.float64).data)
+    key    = 'land-' + digest.hexdigest()
+
+    bits = _MASKS.get(key)
+    if (bits is None and _MASK_DISK['directory'] is not None):
+        try:
+            with np.load(os.path.join(_MASK_DISK['directory'], key + '.npz')) as f:
+                bits = f['bits']
+        except (OSError, KeyError, ValueError):
+            bits = None
+        if (bits is not None):
+            _MASKS.put(key, bits)
+
+    if (bits is None):
+        bits = np.packbits(_rasterize_land(lon, lat, scale, regular).reshape(-1))
+        _MASKS.put(key, bits)
+        directory = _MASK_DISK['directory']
+        if (directory is not None):
+            path = os.path.join(directory, key + '.npz')
+            temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(temp, 'wb') as f:
+                    np.savez(f, bits=bits)
+                os.replace(temp, path)
+            except OSError as e:
+                warnings.warn(f'Mask cache could not be written to {directory} : {e}', UserWarning)
+
+    return np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape).view(bool)
+
+
+# Points inside the land polygons of Natural Earth
+# A regular grid tests only the rows and columns in the bounding box of each polygon.
+def _rasterize_land(lon, lat, scale, regular):
+    lon = (np.asarray(lon, dtype=np.float64) + 180.) % 360. - 180.
+    lat = np.asarray(lat, dtype=np.float64)
+    land = np.zeros((lat.size, lon.size) if regular else lon.shape, dtype=bool)
+
+    polygons = []
+    for geometry in cfeature.LAND.with_scale(scale).geometries():
+        polygons.extend(shapely.get_parts(geometry))
+    if (not regular):
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        union = shapely.multipolygons(polygons)
+        shapely.prepare(union)
+        land[valid] = shapely.contains_xy(union, lon[valid], lat[valid])
+        return land
+
+    for polygon in polygons:
+        xmin, ymin, xmax, ymax = polygon.bounds
+        cols = np.flatnonzero((lon >= xmin) & (lon <= xmax))
+        rows = np.flatnonzero((lat >= ymin) & (lat <= ymax))
+        if (cols.size == 0 or rows.size == 0):
+            continue
+        shapely.prepare(polygon)
+        x, y   = np.meshgrid(lon[cols], lat[rows])
+        inside = shapely.contains_xy(polygon, x, y)
+        land[np.ix_(rows, cols)] |= inside
+
+    return land
+
+
+# Hash of the coordinates of a curvilinear grid or points
+def _grid_key(lon, lat):
+    digest = hashlib.blake2b(repr((lon.shape, lat.shape)).encode(), digest_size=20)
+    digest.update(np.ascontiguousarray(lon, dtype=np.float64).data)
+    digest.update(np.ascontiguousarray(lat, dtype=np.float64).data)
+    return digest.hexdigest()
+
+
+# Hash of the grid, the projection, and the plotted area
+def _triangulation_key(grid_key, projection, bounds):
+    digest = hashlib.blake2b(grid_key.encode(), digest_size=20)
+    digest.update(projection.srs.encode())
+    digest.update(repr(tuple(round(float(b), 6) for b in bounds)).encode())
+    return digest.hexdigest()
+
+
+def _triangulation_get(key):
+    entry = _TRIANGULATIONS.get(key)
+    if (entry is not None or _TRIANGULATION_DISK['directory'] is None):
+        return entry
+
+    path = os.path.join(_TRIANGULATION_DISK['directory'], 'tri-' + key + '.npz')
+    try:
+        with np.load(path) as f:
+            entry = {name: f[name] for name in ('x', 'y', 'triangles', 'mask', 'index')}
+    except (OSError, KeyError, ValueError):
+        return None
+
+    _TRIANGULATIONS.put(key, entry)
+    return entry
+
+
+def _triangulation_put(key, entry):
+    _TRIANGULATIONS.put(key, entry)
+
+    directory = _TRIANGULATION_DISK['directory']
+    if (directory is None):
+        return
+
+    path = os.path.join(directory, 'tri-' + key + '.npz')
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            np.savez(f, **entry)
+        os.replace(temp, path)
+    except OSError as e:
+        warnings.warn(f'Triangulation cache could not be written to {directory} : {e}', UserWarning)
+
+
+# Memory of the chunks read by the reductions of display(reduce=...) : the peak is a few times larger
+_REDUCE_BYTES = 16 * 2**20
+
+
+# Normalized reduction over time : {'op', 'climatology', 'q', 'ddof', 'chunk'}
+# reduce is "mean", "std", or a dictionary with "op" ("mean", "std", "anomaly", or "quantile") and its options
+def _reduce_spec(reduce, vector=False):
+    if (isinstance(reduce, str)):
+        reduce = {'op': reduce}
+    if (not isinstance(reduce, dict)):
+        raise TypeError(f'Invalid reduce : {reduce!r}. Expected "mean", "std", or a dictionary with "op"')
+    unknown = set(reduce) - {'op', 'climatology', 'q', 'ddof', 'chunk'}
+    if (unknown):
+        raise TypeError(f"Unexpected key(s) in reduce: {', '.join(sorted(unknown))}. Allowed keys: chunk, climatology, ddof, op, q")
+
+    spec = {'op': reduce.get('op'), 'climatology': reduce.get('climatology'), 'q': reduce.get('q'), 'ddof': reduce.get('ddof', 0), 'chunk': reduce.get('chunk')}
+    if (spec['op'] not in ('mean', 'std', 'anomaly', 'quantile')):
+        raise ValueError(f'Invalid op of reduce : {spec["op"]}. Expected "mean", "std", "anomaly", or "quantile"')
+    if (spec['op'] == 'anomaly'):
+        if (spec['climatology'] is None):
+            raise TypeError('reduce with op="anomaly" needs "climatology"')
+        if (vector and (not isinstance(spec['climatology'], (list, tuple)) or len(spec['climatology']) != 2)):
+            raise TypeError('reduce with op="anomaly" needs "climatology" of (x, y) for method="vector"')
+    if (spec['op'] == 'quantile'):
+        if (spec['q'] is None or not np.isscalar(spec['q']) or not 0. <= spec['q'] <= 1.):
+            raise ValueError(f'Invalid q of reduce : {spec["q"]}. Expected a number in [0, 1]')
+    if (spec['chunk'] is not None and (isinstance(spec['chunk'], bool) or int(spec['chunk']) != spec['chunk'] or spec['chunk'] < 1)):
+        raise ValueError(f'Invalid chunk of reduce : {spec["chunk"]}. Expected a positive number of time steps')
+
+    return spec
+
+
+# float64 array with NaN for the masked and missing values
+def _nan_filled(values):
+    if (np.ma.isMaskedArray(values)):
+        return values.astype(np.float64).filled(np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+
+# Reduction over time read chunk by chunk : read(t0, t1, part) returns the float64 values (t1-t0,) + shape with NaN for
+# missing values, where part is a slice of the first axis of shape. NaN where no value is available.
+# mean, std, and anomaly (mean - climatology) merge the mean and the sum of squared deviations of each chunk of time steps,
+# so that the memory is a chunk and a few arrays of shape.
+# quantile is exact : all time steps are gathered for a part of the rows at a time, within the same memory.
+def _reduce_time(read, ntime, shape, spec, climatology=None):
+    size  = int(np.prod(shape))
+    chunk = spec['chunk']
+    if (chunk is None):
+        chunk = max(_REDUCE_BYTES // (8 * max(size, 1)), 1)
+
+    if (spec['op'] == 'quantile'):
+        rowsize = size // shape[0] if (shape[0] > 0) else 1
+        nrows   = max(_REDUCE_BYTES // (8 * ntime * max(rowsize, 1)), 1)
+        result  = np.empty(shape, dtype=np.float64)
+        for r0 in range(0, shape[0], nrows):
+            part   = slice(r0, min(r0 + nrows, shape[0]))
+            series = np.empty((ntime,) + result[part].shape, dtype=np.float64)
+            step   = max(chunk * shape[0] // (part.stop - part.start), 1)
+            for t0 in range(0, ntime, step):
+                series[t0:t0+step] = read(t0, min(t0 + step, ntime), part)
+            result[part] = _nanquantile_time(series, spec['q'])
+        return result
+
+    count = np.zeros(shape, dtype=np.int64)
+    mean  = np.zeros(shape, dtype=np.float64)
+    m2    = np.zeros(shape, dtype=np.float64) if (spec['op'] == 'std') else None
+    for t0 in range(0, ntime, chunk):
+        values = read(t0, min(t0 + chunk, ntime), slice(0, shape[0]))
+        valid  = ~np.isnan(values)
+        n      = np.count_nonzero(valid, axis=0)
+        values = np.where(valid, values, 0.)
+        cmean  = np.divide(values.sum(axis=0), n, out=np.zeros(shape), where=(n > 0))
+        total  = count + n
+        delta  = cmean - mean
+        ratio  = np.divide(n, total, out=np.zeros(shape), where=(total > 0))
+        mean  += delta * ratio
+        if (m2 is not None):
+            deviation = np.where(valid, values - cmean, 0.)
+            m2 += np.sum(deviation * deviation, axis=0) + delta * delta * count * ratio
+        count  = total
+
+    if (spec['op'] == 'std'):
+        ddof = spec['ddof']
+        return np.sqrt(np.divide(m2, count - ddof, out=np.full(shape, np.nan), where=(count > ddof)))
+    mean[count == 0] = np.nan
+    if (spec['op'] == 'anomaly'):
+        mean -= climatology
+    return mean
+
+
+# Quantile over the first axis ignoring NaN, with the linear interpolation of np.nanquantile()
+# The series is sorted in place (NaN to the end), instead of the loop over the points of np.nanquantile()
+def _nanquantile_time(series, q):
+    series.sort(axis=0)
+    count    = np.count_nonzero(~np.isnan(series), axis=0)
+    position = q * np.maximum(count - 1, 0)
+    lower    = np.floor(position).astype(np.intp)
+    upper    = np.minimum(lower + 1, np.maximum(count - 1, 0))
+    below    = np.take_along_axis(series, lower[np.newaxis], axis=0)[0]
+    above    = np.take_along_axis(series, upper[np.newaxis], axis=0)[0]
+    result   = below + (above - below) * (position - lower)
+    result[count == 0] = np.nan
+    return result
+
+
+# ContourSet.draw() of matplotlib (and of cartopy's contour sets) is not marked by allow_rasterization:
+# set_rasterized() warns, and hatched contours are not rasterized. The draw of the artist is wrapped by that decorator.
+# Checked with matplotlib 3.10. Returns False if the decorator is not available
+def _allow_rasterization(artist):
+    if (getattr(artist.draw, '_supports_rasterization', False)):
+        return True
+    decorator = getattr(martist, 'allow_rasterization', None)
+    if (decorator is None):
+        return False
+    draw = artist.draw
+    artist.draw = types.MethodType(decorator(lambda artist, renderer: draw(renderer)), artist)
+    return True
+
+
+# Path effect drawing the paths simplified by _simplify_path() with a tolerance of points
+# The tolerance is converted to the coordinate of the path with the transform and the dpi of each draw,
+# and the simplified path is kept until the path or the tolerance changes
+class _SimplifyEffect(mpatheffects.AbstractPathEffect):
+
+    def __init__(self, tolerance):
+        super().__init__()
+        self.tolerance = tolerance
+        self.__paths   = {}
+
+
+    def draw_path(self, renderer, gc, tpath, affine, rgbFace=None):
+        matrix    = affine.get_matrix()
+        scale     = np.sqrt(abs(matrix[0,0] * matrix[1,1] - matrix[0,1] * matrix[1,0]))
+        tolerance = renderer.points_to_pixels(self.tolerance) / scale if (scale > 0.) else 0.
+        cached    = self.__paths.get(id(tpath))
+        if (cached is None or cached[0] is not tpath or cached[1] != tolerance):
+            cached = (tpath, tolerance, _simplify_path(tpath, tolerance))
+            self.__paths[id(tpath)] = cached
+        renderer.draw_path(gc, cached[2], affine, rgbFace)
+
+
+# Path of contour()/contourf() simplified by GEOS's topology-preserving simplifier
+# The rings and lines of the path are simplified together, so that they do not cross each other.
+def _simplify_path(path, tolerance):
+    vertices = path.vertices
+    if (len(vertices) < 3 or tolerance <= 0):
+        return path
+    codes = path.codes
+    if (codes is None):
+        codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+        codes[0] = Path.MOVETO
+
+    # Parts start at MOVETO : closed parts end with CLOSEPOLY, whose vertex is replaced by the first one
+    starts = np.flatnonzero(codes == Path.MOVETO)
+    ends   = np.append(starts[1:], len(codes))
+    closed = codes[ends - 1] == Path.CLOSEPOLY
+    coords = vertices.copy()
+    coords[ends[closed] - 1] = coords[starts[closed]]
+    parts  = np.repeat(np.arange(starts.size), ends - starts)
+    # Parts of less than 2 (open) or 4 (closed) vertices are kept as they are
+    large  = (ends - starts) >= np.where(closed, 4, 2)
+    keep   = large[parts]
+    if (not np.any(keep)):
+        return path
+
+    lines      = shapely.linestrings(coords[keep], indices=parts[keep])
+    simplified = shapely.simplify(shapely.multilinestrings(lines), tolerance, preserve_topology=True)
+    simple, index = shapely.get_coordinates(shapely.get_parts(simplified), return_index=True)
+    if (len(simple) >= np.count_nonzero(keep)):
+        return path
+
+    index = np.flatnonzero(large)[index]
+    first = np.r_[True, index[1:] != index[:-1]]
+    last  = np.r_[index[1:] != index[:-1], True]
+    simple_codes = np.full(len(simple), Path.LINETO, dtype=Path.code_type)
+    simple_codes[first] = Path.MOVETO
+    simple_codes[last & closed[index]] = Path.CLOSEPOLY
+
+    coords = np.concatenate((simple      , vertices[~keep]))
+    codes  = np.concatenate((simple_codes, codes[~keep]   ))
+    return Path(coords, codes)
+
+
+# Interpolation weights from the data grid to the regridded vector grid
+_REGRID = _LRUCache(32)
+
+
+# Bilinear interpolation weights from the rectilinear grid (lon, lat) to the regular grid in the coordinate of projection
+# The target grid follows cartopy's regrid_shape : an integer is the number of points along the shorter side of extent.
+# A sparse matrix of the weights is cached for each (grid, projection, extent, regrid_shape).
+def _regrid_weights(lon, lat, projection, extent, regrid_shape):
+    x0, x1, y0, y1 = extent
+    if (isinstance(regrid_shape, collections.abc.Sequence)):
+        nx, ny = int(regrid_shape[0]), int(regrid_shape[1])
+    else:
+        size   = int(regrid_shape)
+        aspect = (x1 - x0) / (y1 - y0)
+        if (aspect >= 1):
+            nx, ny = int(size * aspect), size
+        else:
+            nx, ny = size, int(size / aspect)
+
+    key    = (lon.tobytes(), lat.tobytes(), projection, round(x0, 6), round(x1, 6), round(y0, 6), round(y1, 6), nx, ny)
+    regrid = _REGRID.get(key)
+    if (regrid is not None):
+        return regrid
+
+    xt, yt = np.meshgrid(np.linspace(x0, x1, nx), np.linspace(y0, y1, ny))
+    points = ccrs.PlateCarree().transform_points(projection, xt, yt)
+    lon_t  = points[...,0].ravel()
+    lat_t  = points[...,1].ravel()
+    valid  = np.isfinite(lon_t) & np.isfinite(lat_t)
+    lon_t  = np.where(valid, lon_t, lon[0])
+    lat_t  = np.where(valid, lat_t, lat[0])
+
+    # Longitudes on the branch of the grid
+    lon_t = lon[0] + (lon_t - lon[0]) % 360.
+    i  = np.clip(np.searchsorted(lon, lon_t, side='right') - 1, 0, lon.size-2)
+    fx = (lon_t - lon[i]) / (lon[i+1] - lon[i])
+
+    # Latitudes may be descending
+    if (lat[0] <= lat[-1]):
+        lat_a = lat
+    else:
+        lat_a = lat[::-1]
+    j  = np.clip(np.searchsorted(lat_a, lat_t, side='right') - 1, 0, lat.size-2)
+    fy = (lat_t - lat_a[j]) / (lat_a[j+1] - lat_a[j])
+    if (lat[0] <= lat[-1]):
+        j0, j1 = j, j+1
+    else:
+        j0, j1 = lat.size-1-j, lat.size-2-j
+
+    valid = valid & (fx >= 0.) & (fx <= 1.) & (fy >= 0.) & (fy <= 1.)
+    rows  = np.tile(np.where(valid)[0], 4)
+    cols  = np.concatenate([j0*lon.size + i, j0*lon.size + i+1, j1*lon.size + i, j1*lon.size + i+1])[np.tile(valid, 4)]
+    wgts  = np.concatenate([(1-fx)*(1-fy), fx*(1-fy), (1-fx)*fy, fx*fy])[np.tile(valid, 4)]
+
+    regrid = {'matrix': sparse.csr_matrix((wgts, (rows, cols)), shape=(nx*ny, lat.size*lon.size)),
+              'valid' : valid           ,
+              'lon'   : points[...,0].ravel(),
+              'lat'   : points[...,1].ravel(),
+              'x'     : xt              ,
+              'y'     : yt              ,
+             }
+    _REGRID.put(key, regrid)
+
+    return regrid
+
+
+# Name and Natural Earth scale of the map resolution
+def _map_resolution(resolution):
+    resolution = resolution.lower()
+    if (resolution == 'high' or resolution == 'h' or resolution == '10m'):
+        return 'high', '10m'
+    elif (resolution == 'medium' or resolution == 'm' or resolution == '50m'):
+        return 'medium', '50m'
+    elif (resolution == 'low' or resolution == 'l' or resolution == '110m'):
+        return 'low', '110m'
+    else:
+        raise ValueError(f'Invalid map resolution : {resolution}\n'
+                         'Use one of {"high", "h", "10m", "medium", "m", "50m", "low", "l", "110m"}'
+                        )
+
+
+# Half width of the Web Mercator plane (EPSG:3857) in meters
+_WEB_MERCATOR = 20037508.342789244
+
+
+# JSON token of the style values : arrays as lists, and colormaps and norms by their contents
+def _style_token(value):
+    if (isinstance(value, np.ndarray) or isinstance(value, np.generic)):
+        return value.tolist()
+    elif (isinstance(value, mcolors.Colormap)):
+        return {'name'  : value.name,
+                'lut'   : value(np.linspace(0., 1., value.N)).tolist(),
+                'extend': [value.get_under().tolist(), value.get_over().tolist(), value.get_bad().tolist()],
+               }
+    elif (isinstance(value, mcolors.Normalize)):
+        return [type(value).__name__, value.vmin, value.vmax, value.clip]
+    return repr(value)
+
+
+# Manifest of the tile cache : {'version': ..., 'tiles': {'z/x/y': {'digest': digest or 'empty', 'path': file relative to directory}}}
+def _tile_manifest_load(directory):
+    try:
+        with open(os.path.join(directory, 'tiles.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'tiles': {}}
+    if (not isinstance(manifest, dict) or not isinstance(manifest.get('tiles'), dict)):
+        return {'tiles': {}}
+    return manifest
+
+
+# Reuse the file of an unchanged tile at path : False if the file has been removed
+def _tile_reuse(directory, record, path):
+    if (record['path'] is None):
+        return True     # Empty tile
+
+    source = os.path.join(directory, record['path'])
+    if (os.path.abspath(source) == os.path.abspath(path)):
+        return os.path.exists(path)
+    if (not os.path.exists(source)):
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if (os.path.exists(path)):
+        os.remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+    record['path'] = os.path.relpath(path, directory)
+    return True
+
+
+def _tile_manifest_save(directory, manifest):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'tiles.json')
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp, path)
+
+
+# Render many figures on a process pool
+# Each spec is a dictionary with the following keys:
+#   'mapplot' : keywords of mapplot() (lon and lat are required, posit defaults to [1,1,1])
+#   'gxout'   : method name or keywords of gxout()
+#   'display' : keywords of display() ('data' and 'y' may be ndarray or path to a .npy file)
+#   'output'  : path of the output file
+#   'figure'  : (optional) keywords of matplotlib.figure.Figure
+#   'cbar'    : (optional) True or keywords of set_cbar()
+#   'label'   : (optional) True or keywords of set_label()
+#   'title'   : (optional) title string
+#   'savefig' : (optional) keywords of savefig()
+# Workers initialize matplotlib/cartopy and the coastline geometries once and reuse them for all jobs.
+# A list of results is returned in the order of specs; errors are reported per job and not raised.
+def render_batch(specs, workers=None, chunksize=1):
+    specs  = list(specs)
+    scales = sorted({_map_resolution(spec.get('mapplot', {}).get('resolution', 'medium'))[1] for spec in specs})
+
+    if (workers == 1):
+        # Serial execution in this process
+        _batch_init(scales)
+        return [_batch_job(spec) for spec in specs]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_batch_init, initargs=(scales,)) as executor:
+        results = list(executor.map(_batch_job, specs, chunksize=chunksize))
+
+    return results
+
+
+# Initializer of the batch workers : load the coastline geometries of the required scales
+def _batch_init(scales):
+    for scale in scales:
+        for geometry in cfeature.COASTLINE.with_scale(scale).geometries():
+            pass
+
+
+def _batch_load(value):
+    if (isinstance(value, str)):
+        return np.load(value, mmap_mode='r')
+    return value
+
+
+# Render one spec of render_batch()
+def _batch_job(spec):
+    result = {'output': spec.get('output'), 'ok': False, 'error': None, 'seconds': 0.}
+    start  = time.perf_counter()
+    try:
+        fig = _render_spec(spec)
+        fig.savefig(spec['output'], **spec.get('savefig', {}))
+        result['ok'] = True
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+# Figure of a spec of render_batch() or serve()
+# load(value) reads the arrays given as paths (or shared memory blocks)
+def _render_spec(spec, load=_batch_load):
+    fig = Figure(**spec.get('figure', {}))
+    FigureCanvasAgg(fig)
+
+    kwargs = dict(spec['mapplot'])
+    posit  = kwargs.pop('posit', [1,1,1])
+    lon    = load(kwargs.pop('lon'))
+    lat    = load(kwargs.pop('lat'))
+    mp     = mapplot(fig, posit, lon, lat, **kwargs)
+
+    gxout = spec.get('gxout', 'contour')
+    if (isinstance(gxout, str)):
+        gxout = {'method': gxout}
+    mp.gxout(**gxout)
+
+    display = dict(spec.get('display', {}))
+    data    = load(display.pop('data'))
+    y       = load(display.pop('y', None))
+    mp.display(data, y=y, **display)
+
+    if (spec.get('label')):
+        mp.set_label(**({} if spec['label'] is True else spec['label']))
+    if (spec.get('cbar')):
+        mp.set_cbar(**({} if spec['cbar'] is True else spec['cbar']))
+    if (spec.get('title') is not None):
+        mp.set_title(spec['title'])
+
+    return fig
+
+
+# Messages of serve() : 8-byte length of a JSON header, the header, and header['nbytes'] bytes of payload
+# Larger headers and payloads are refused before they are allocated
+_MAX_HEADER  = 64 * 2**20
+_MAX_PAYLOAD = 2**30
+def _send_message(sock, header, payload=b''):
+    header = dict(header, nbytes=len(payload))
+    text   = json.dumps(header).encode()
+    sock.sendall(struct.pack('!Q', len(text)) + text)
+    if (payload):
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, nbytes):
+    buffer = bytearray(nbytes)
+    view   = memoryview(buffer)
+    while (nbytes > 0):
+        count = sock.recv_into(view, nbytes)
+        if (count == 0):
+            raise ConnectionError('Connection closed by the peer')
+        view   = view[count:]
+        nbytes = nbytes - count
+    return bytes(buffer)
+
+
+# (header, payload), or (None, None) if the peer closed the connection
+def _recv_message(sock):
+    first = sock.recv(8, socket.MSG_WAITALL)
+    if (len(first) == 0):
+        return None, None
+    if (len(first) < 8):
+        first = first + _recv_exact(sock, 8-len(first))
+    length = struct.unpack('!Q', first)[0]
+    if (length > _MAX_HEADER):
+        raise ConnectionError(f'Header of {length} bytes exceeds the limit of {_MAX_HEADER} bytes')
+    header = json.loads(_recv_exact(sock, length))
+    nbytes = header.get('nbytes', 0)
+    if (not isinstance(nbytes, int) or isinstance(nbytes, bool) or nbytes < 0 or nbytes > _MAX_PAYLOAD):
+        raise ConnectionError(f'Invalid payload size : {nbytes!r}. Expected 0 to {_MAX_PAYLOAD} bytes')
+    payload = _recv_exact(sock, nbytes)
+    return header, payload
+
+
+# Socket family and address of serve() and render_request()
+# A string is the path of a Unix socket, and an integer or a (host, port) tuple is a TCP address (host defaults to localhost)
+# The server has no authentication and opens files of the spec, so TCP hosts must be loopback addresses
+def _server_address(address):
+    if (isinstance(address, (str, os.PathLike))):
+        return socket.AF_UNIX, os.fspath(address)
+    if (isinstance(address, int)):
+        return socket.AF_INET, ('127.0.0.1', address)
+
+    host, port = address
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f'Invalid host : {host!r} ({e})') from None
+    if (not all(ipaddress.ip_address(info[4][0].split('%')[0]).is_loopback for info in infos)):
+        raise ValueError(f'Invalid host : {host!r}. The render server is unauthenticated and accepts only loopback addresses (localhost, 127.0.0.1, ::1)')
+    family, sockaddr = infos[0][0], infos[0][4]
+    return family, sockaddr
+
+
+# Attach an existing shared memory block without registering it to the resource tracker,
+# which would unlink the block of the client when this process exits (Python < 3.13)
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        if (os.name == 'posix'):
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+# Projection of a serialized spec : {'name': name of a class in cartopy.crs, keywords...}
+# The instances are reused from cache, so that their coastline and contour caches stay warm
+def _spec_projection(value, cache):
+    if (not isinstance(value, dict)):
+        return value
+    key = json.dumps(value, sort_keys=True)
+    if (key not in cache):
+        kwargs = dict(value)
+        name   = kwargs.pop('name')
+        if (not isinstance(getattr(ccrs, name, None), type) or not issubclass(getattr(ccrs, name), ccrs.CRS)):
+            raise ValueError(f'Invalid projection : {name}. Use the name of a projection class of cartopy.crs')
+        cache[key] = getattr(ccrs, name)(**kwargs)
+    return cache[key]
+
+
+# Copy of a serialized spec with the projection and the levels of display() converted
+def _spec_values(spec, projections):
+    spec = dict(spec)
+    spec['mapplot'] = dict(spec['mapplot'])
+    if ('projection' in spec['mapplot']):
+        spec['mapplot']['projection'] = _spec_projection(spec['mapplot']['projection'], projections)
+    spec['display'] = dict(spec.get('display', {}))
+    if (isinstance(spec['display'].get('levels'), list)):
+        spec['display']['levels'] = np.array(spec['display']['levels'])
+    return spec
+
+
+# State of serve() kept warm across requests
+class _RenderServer:
+
+    def __init__(self, scales):
+        self.projections = {}
+        self.requests    = 0
+        self.started     = time.time()
+        _batch_init(scales)
+
+
+    # Arrays of a request : path to a .npy file (memory-mapped), name of a shared memory block, or list
+    # Shared memory is copied, so that the client can release it after the response
+    def load(self, value):
+        if (isinstance(value, dict) and 'shm' in value):
+            block = _attach_shared_memory(value['shm'])
+            try:
+                array = np.ndarray(value['shape'], dtype=value.get('dtype', 'float64'), buffer=block.buf,
+                                   offset=value.get('offset', 0)).copy()
+            finally:
+                block.close()
+            return array
+        if (isinstance(value, list)):
+            return np.array(value)
+        return _batch_load(value)
+
+
+    # Encoded image of a render request
+    def render(self, spec):
+        fig    = _render_spec(_spec_values(spec, self.projections), load=self.load)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, **dict({'format': 'png'}, **spec.get('savefig', {})))
+        return buffer.getvalue()
+
+
+    # Answer the requests of a connection until the client closes it
+    # Returns False if a shutdown was requested
+    def handle(self, conn):
+        while True:
+            header, payload = _recv_message(conn)
+            if (header is None):
+                return True
+
+            command = header.get('command', 'render')
+            if (command == 'shutdown'):
+                _send_message(conn, {'ok': True})
+                return False
+            elif (command == 'ping'):
+                _send_message(conn, {'ok': True, 'requests': self.requests, 'uptime': time.time()-self.started})
+                continue
+
+            self.requests = self.requests + 1
+            start = time.perf_counter()
+            try:
+                if (command != 'render'):
+                    raise ValueError(f'Invalid command : {command}. Use "render", "ping", or "shutdown"')
+                image  = self.render(header['spec'])
+                result = {'ok': True, 'error': None}
+            except Exception:
+                image  = b''
+                result = {'ok': False, 'error': traceback.format_exc()}
+            result['seconds'] = time.perf_counter() - start
+            _send_message(conn, result, image)
+
+
+# Long-running render server on a Unix socket (address is a path) or on a localhost TCP port (address is an integer)
+# Each request is a spec of render_batch() without 'output', and the encoded image is returned.
+# In addition to render_batch(), the projection may be {'name': class name in cartopy.crs, keywords...},
+# and the arrays may be lists or {'shm': shared memory name, 'shape': ..., 'dtype': ...}.
+# The coastlines of resolutions, the projections, and the caches of this module are kept warm across requests.
+# Requests are rendered one at a time. The server stops on a "shutdown" request, after max_requests renders, or on KeyboardInterrupt.
+def serve(address, resolutions=('medium',), max_requests=None):
+    family, address = _server_address(address)
+    if (family == socket.AF_UNIX and os.path.lexists(address)):
+        # Stale socket of a previous server : any other file is kept
+        if (not stat.S_ISSOCK(os.lstat(address).st_mode)):
+            raise ValueError(f'Invalid address : {address} exists and is not a socket')
+        os.remove(address)
+
+    state  = _RenderServer(sorted({_map_resolution(resolution)[1] for resolution in resolutions}))
+    server = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if (family != socket.AF_UNIX):
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        if (family == socket.AF_UNIX):
+            # Only the owner can connect : no connection is accepted before listen()
+            os.chmod(address, 0o600)
+        server.listen()
+        running = True
+        while (running and (max_requests is None or state.requests < max_requests)):
+            conn, peer = server.accept()
+            with conn:
+                try:
+                    running = state.handle(conn)
+                except ConnectionError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if (family == socket.AF_UNIX and os.path.lexists(address) and stat.S_ISSOCK(os.lstat(address).st_mode)):
+            os.remove(address)
+
+
+# Client of serve() : encoded image of spec
+# Raises RuntimeError with the traceback of the server if the rendering failed
+def render_request(spec, address, timeout=None):
+    family, address = _server_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        _send_message(sock, {'command': 'render', 'spec': spec})
+        header, payload = _recv_message(sock)
+    if (header is None):
+        raise RuntimeError('The render server closed the connection without a response')
+    if (not header['ok']):
+        raise RuntimeError(f'Rendering failed on the server:\n{header["error"]}')
+    return payload
+
+
+# Render a time series described by spec, a dictionary or the path to a YAML/JSON file (see README)
+# The input is read one time step at a time, and the figure is kept and updated by render_frames().
+# Outputs are written atomically, so that skip_existing=True resumes an interrupted run.
+def render_series(spec, skip_existing=False, steps=None, verbose=False):
+    if (not isinstance(spec, collections.abc.Mapping)):
+        spec = _read_spec(spec)
+    unknown = set(spec) - {'input', 'variable', 'time', 'lon', 'lat', 'lev', 'steps', 'mapplot', 'gxout', 'display',
+                           'output', 'figure', 'cbar', 'label', 'title', 'savefig', 'skip_existing'}
+    if unknown:
+        raise ValueError(f'Unexpected key(s) in the spec: {", ".join(sorted(unknown))}')
+    spec = _spec_values(spec, {})
+    skip_existing = skip_existing or spec.get('skip_existing', False)
+
+    source = _SeriesSource(spec)
+    try:
+        if (steps is None):
+            steps = spec.get('steps')
+        indices = range(source.ntime)
+        if (steps is not None):
+            indices = indices[slice(*steps)]
+
+        outputs = {t: spec['output'].format(index=t, time=source.label(t, filename=True)) for t in indices}
+        todo    = [t for t in indices if (not skip_existing or not os.path.exists(outputs[t]))]
+        stats   = {'frames': 0, 'skipped': len(indices)-len(todo), 'seconds': 0., 'fps': 0.}
+        if (verbose):
+            print(f'render_series : {len(todo)} of {len(indices)} steps to render')
+        if (len(todo) == 0):
+            return stats
+
+        fig = Figure(**spec.get('figure', {}))
+        FigureCanvasAgg(fig)
+        kwargs = dict(spec['mapplot'])
+        posit  = kwargs.pop('posit', [1,1,1])
+        mp     = mapplot(fig, posit, source.lon, source.lat, lev=source.lev, **kwargs)
+
+        gxout = spec.get('gxout', 'contour')
+        if (isinstance(gxout, str)):
+            gxout = {'method': gxout}
+        mp.gxout(**gxout)
+        if (spec.get('label')):
+            mp.set_label(**({} if spec['label'] is True else spec['label']))
+
+        output = _SeriesOutput(fig, spec.get('savefig', {}))
+        cbar   = spec.get('cbar') or None
+
+        # Read each step just before it is drawn : only one step is held in memory
+        def frames():
+            for t in todo:
+                output.path = outputs[t]
+                if (spec.get('title') is not None):
+                    mp.set_title(spec['title'].format(index=t, time=source.label(t)))
+                if (verbose):
+                    print(f'render_series : {output.path}', flush=True)
+                yield source.read(t)
+
+        result = mp.render_frames(frames(), writer=output, cbar=cbar, **spec['display'])
+        stats.update(result)
+    finally:
+        source.close()
+
+    return stats
+
+
+# Spec of render_series() from a YAML (PyYAML is required) or JSON file
+def _read_spec(path):
+    with open(path) as f:
+        if (os.fspath(path).lower().endswith('.json')):
+            return json.load(f)
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('PyYAML is required to read the YAML spec file. Install it, or write the spec in JSON') from None
+        return yaml.safe_load(f)
+
+
+# Animation writer of render_series() : each frame is saved to the current path through a temporary file
+class _SeriesOutput:
+
+    def __init__(self, fig, savefig_args):
+        self.fig  = fig
+        self.args = dict(savefig_args)
+        self.path = None
+
+
+    def grab_frame(self, **kwargs):
+        directory = os.path.dirname(self.path)
+        if (directory):
+            os.makedirs(directory, exist_ok=True)
+        args = dict(self.args)
+        args.setdefault('format', os.path.splitext(self.path)[1][1:] or None)
+        temporary = self.path + '.part'
+        self.fig.savefig(temporary, **args)
+        os.replace(temporary, self.path)
+
+
+# Lazy array of one time step of a variable of render_series() (netCDF4/xarray variable, or memmap)
+# Indexing reads only the requested part of the step. Masked values of netCDF4 are kept as a masked array
+class _SeriesStep:
+
+    def __init__(self, variable, axis, t):
+        self.variable = variable
+        self.axis     = axis
+        self.t        = t
+        self.shape    = tuple(variable.shape[:axis]) + tuple(variable.shape[axis+1:])
+        self.ndim     = len(self.shape)
+        self.dtype    = np.dtype(variable.dtype)
+
+
+    def __getitem__(self, index):
+        if (not isinstance(index, tuple)):
+            index = (index,)
+        if (any(item is Ellipsis for item in index)):
+            i     = [item is Ellipsis for item in index].index(True)
+            index = index[:i] + (slice(None),) * (self.ndim - len(index) + 1) + index[i+1:]
+        index = index + (slice(None),) * (self.ndim - len(index))
+        index = index[:self.axis] + (self.t,) + index[self.axis:]
+
+        array = self.variable[index]
+        if (hasattr(array, 'isel')):
+            array = array.values
+        return array
+
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        if (np.ma.isMaskedArray(array)):
+            array = np.ma.filled(array.astype(np.float64), np.nan)
+        return np.asarray(array, dtype=dtype)
+
+
+# Member of a .npz file without reading it : a memmap if the member is stored without compression
+# Compressed members (np.savez_compressed) cannot be read in parts, and are loaded entirely with a warning
+def _npz_member(npz, path, name):
+    import zipfile
+    member = name + '.npy'
+    if (member not in npz.zip.namelist()):
+        raise KeyError(f'{name} is not a variable of {path}')
+    info = npz.zip.getinfo(member)
+    if (info.compress_type != zipfile.ZIP_STORED):
+        warnings.warn(f'Variable "{name}" of {path} is compressed and is loaded entirely into memory. '
+                      'Save it with np.savez() (not np.savez_compressed()) or in .npy to read one time step at a time', UserWarning)
+        return npz[name]
+
+    with open(path, 'rb') as f:
+        # Local file header of the zip member : 30 bytes, the file name, and the extra field
+        f.seek(info.header_offset)
+        header = f.read(30)
+        if (header[:4] != b'PK\x03\x04'):
+            return npz[name]
+        f.seek(info.header_offset + 30 + struct.unpack('<H', header[26:28])[0] + struct.unpack('<H', header[28:30])[0])
+        version = np.lib.format.read_magic(f)
+        if (version == (1, 0)):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        elif (version == (2, 0)):
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            return npz[name]
+        if (dtype.hasobject):
+            return npz[name]
+        offset = f.tell()
+
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, order='F' if fortran else 'C', offset=offset)
+
+
+# Input of render_series() : a variable of a netCDF file (xarray or netCDF4 is required), a key of a .npz file, or a .npy file
+# The first dimension (or the dimension named by spec['time']) is the time, and the others are (lev,) lat, lon.
+# Coordinates of netCDF are read from the dimensions of the variable unless they are given in the spec.
+class _SeriesSource:
+
+    def __init__(self, spec):
+        self.path    = spec['input']
+        self.dataset = None
+        self.dims    = None
+        self.times   = None
+        variable     = spec.get('variable')
+        names        = variable if isinstance(variable, list) else [variable]
+        if (len(names) > 2):
+            raise ValueError(f'Invalid variable : {variable}. Give a name, or a list of the x and y components for method=vector')
+        self.vector  = isinstance(variable, list)
+
+        suffix = os.path.splitext(self.path)[1].lower()
+        if (suffix == '.npy'):
+            if (self.vector):
+                raise ValueError('A .npy file has only one variable : use .npz or netCDF for method=vector')
+            self.variables = [np.load(self.path, mmap_mode='r')]
+            self.axis      = 0
+            coords         = {}
+        elif (suffix == '.npz'):
+            self.dataset   = np.load(self.path)
+            self.variables = [_npz_member(self.dataset, self.path, name) for name in names]
+            self.axis      = 0
+            coords         = self.dataset
+        else:
+            self.__open_netcdf(names, spec.get('time'))
+            coords = self.coords
+
+        self.ntime = self.variables[0].shape[self.axis]
+        self.lon   = self.__coordinate(spec.get('lon'), coords, 'lon', -1)
+        self.lat   = self.__coordinate(spec.get('lat'), coords, 'lat', -2)
+        self.lev   = 0.
+        if (len(self.variables[0].shape) == 4 or spec.get('lev') is not None):
+            self.lev = self.__coordinate(spec.get('lev'), coords, 'lev', -3)
+
+
+    def __open_netcdf(self, names, time):
+        try:
+            import xarray
+        except ImportError:
+            xarray = None
+
+        if (xarray is not None):
+            self.dataset   = xarray.open_dataset(self.path)
+            self.variables = [self.dataset[name] for name in names]
+            dims           = self.variables[0].dims
+            self.coords    = {dim: self.dataset[dim].values for dim in dims if (dim in self.dataset.coords)}
+        else:
+            try:
+                import netCDF4
+            except ImportError:
+                raise ImportError('xarray or netCDF4 is required to read netCDF files') from None
+            self.dataset   = netCDF4.Dataset(self.path)
+            self.variables = [self.dataset.variables[name] for name in names]
+            dims           = self.variables[0].dimensions
+            self.coords    = {dim: self.dataset.variables[dim][:] for dim in dims if (dim in self.dataset.variables)}
+
+        self.dims = list(dims)
+        self.axis = 0 if (time is None) else self.dims.index(time)
+        times     = self.coords.get(self.dims[self.axis])
+        if (times is not None and xarray is None and hasattr(self.dataset.variables[self.dims[self.axis]], 'units')):
+            times = netCDF4.num2date(times, self.dataset.variables[self.dims[self.axis]].units,
+                                     getattr(self.dataset.variables[self.dims[self.axis]], 'calendar', 'standard'))
+        self.times = times
+
+
+    # Coordinate given in the spec (list, path to a .npy file, or name in the file), or the dimension of the variable
+    def __coordinate(self, value, coords, name, position):
+        if (isinstance(value, str) and value.lower().endswith('.npy')):
+            return np.load(value)
+        if (isinstance(value, str)):
+            return np.asarray(coords[value])
+        if (value is not None):
+            return np.asarray(value)
+
+        if (self.dims is not None):
+            others = [dim for i, dim in enumerate(self.dims) if (i != self.axis)]
+            if (len(others) >= -position and others[position] in coords):
+                return np.asarray(coords[others[position]])
+        raise ValueError(f'Coordinate "{name}" of {self.path} was not found. Give it in the spec')
+
+
+    # Label of step t for the output name and the title
+    # filename=True gives a label without ':' and spaces (e.g., 20240102T0000) for the output name
+    def label(self, t, filename=False):
+        if (self.times is None):
+            return str(t)
+        value = self.times[t]
+        if (isinstance(value, np.datetime64)):
+            if (filename):
+                return np.datetime_as_string(value, unit='m').replace('-', '').replace(':', '')
+            return np.datetime_as_string(value, unit='m')
+        if (filename and hasattr(value, 'strftime')):
+            return value.strftime('%Y%m%dT%H%M')
+        if (filename):
+            return str(value).replace(':', '').replace(' ', '_')
+        return str(value)
+
+
+    # Data of step t, or a tuple of x and y components
+    # Nothing is read here : display() reads the selected level in the plotted area through _SeriesStep
+    def read(self, t):
+        arrays = [_SeriesStep(variable, self.axis, t) for variable in self.variables]
+        if (self.vector):
+            return tuple(arrays)
+        return arrays[0]
+
+
+    def close(self):
+        if (self.dataset is not None and hasattr(self.dataset, 'close')):
+            self.dataset.close()
+
+
+# Command line interface : entry point of `python mapplot.py` and mapplot-render
+# python mapplot.py serve (--socket PATH | --port PORT)
+# python mapplot.py render SPEC [--skip-existing] [--steps START:STOP[:STEP]]
+def main(argv=None):
+    import argparse
+    parser   = argparse.ArgumentParser(prog='mapplot', description='Command line interface of mapplot')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('serve', help='run a render server (see serve() in README)')
+    where   = command.add_mutually_exclusive_group(required=True)
+    where.add_argument('--socket', help='path of the Unix socket')
+    where.add_argument('--port'  , type=int, help='TCP port on localhost')
+    command.add_argument('--resolution'  , action='append', default=[], help='coastline resolution to preload (repeatable, default: medium)')
+    command.add_argument('--max-requests', type=int, default=None, help='stop after this number of renders')
+
+    command = commands.add_parser('render', help='render a time series from a spec file (see render_series() in README)')
+    command.add_argument('spec', help='YAML or JSON spec file')
+    command.add_argument('--skip-existing', action='store_true', help='do not render the steps whose output exists')
+    command.add_argument('--steps'        , default=None, help='steps to render as START:STOP[:STEP]')
+    command.add_argument('--quiet'        , action='store_true', help='do not print the progress')
+
+    args = parser.parse_args(argv)
+    if (args.command == 'serve'):
+        serve(args.socket if args.socket is not None else args.port,
+              resolutions=(args.resolution or ['medium']), max_requests=args.max_requests)
+    elif (args.command == 'render'):
+        steps = None
+        if (args.steps is not None):
+            steps = [int(value) if value else None for value in args.steps.split(':')]
+        stats = render_series(args.spec, skip_existing=args.skip_existing, steps=steps, verbose=not args.quiet)
+        if (not args.quiet):
+            print(f'render_series : {stats["frames"]} rendered, {stats["skipped"]} skipped in {stats["seconds"]:.2f} s')
+    return 0
+
+
+if (__name__ == '__main__'):
+    raise SystemExit(main())
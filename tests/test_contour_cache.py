@@ -0,0 +1,78 @@
+# Contours replayed from the contour cache must be identical to the contours drawn without it
+import os
+import sys
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import cartopy.crs as ccrs
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mapplot as mp_module
+from mapplot import mapplot
+
+
+LON    = np.arange(  0., 360., 2.5)
+LAT    = np.arange(-90., 90.+1.25, 2.5)
+LEVELS = np.linspace(-1., 1., 11)
+
+
+def field():
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    data = np.ma.masked_greater(np.cos(y) * np.sin(3.*x) + 0.3 * np.cos(5.*y), 1.)
+    return data
+
+
+def render(method, projection):
+    args = {'projection': ccrs.Robinson()} if (projection == 'Robinson') else {}
+    mp   = mapplot(None, [1,1,1], LON, LAT, **args)
+    mp.gxout(method)
+    mp.display(field(), levels=LEVELS)
+    return mp.to_rgba(dpi=60)
+
+
+@pytest.fixture
+def contour_cache():
+    if (not mp_module._CONTOUR_REPLAY['enabled']):
+        pytest.skip('contour replay is not checked with this matplotlib')
+    yield
+    mp_module.set_contour_cache(maxbytes=0)
+
+
+def test_contour_cache_disabled_by_default():
+    mp_module._CONTOURS.clear()
+    render('shaded', 'PlateCarree')
+    assert len(mp_module._CONTOURS) == 0
+
+
+@pytest.mark.parametrize('method'    , ['contour', 'shaded'])
+@pytest.mark.parametrize('projection', ['PlateCarree', 'Robinson'])
+def test_contour_cache_hit_matches_fresh(contour_cache, method, projection):
+    mp_module.set_contour_cache(maxbytes=0)
+    fresh = render(method, projection)
+
+    mp_module.set_contour_cache()
+    miss = render(method, projection)
+    assert len(mp_module._CONTOURS) == 1
+    hit  = render(method, projection)
+    assert len(mp_module._CONTOURS) == 1
+    assert mp_module._CONTOUR_REPLAY['enabled']     # Replayed, not drawn again after a failure
+
+    assert np.array_equal(miss, fresh)
+    assert np.array_equal(hit , fresh)
+
+
+def test_contour_cache_disk_hit_matches_fresh(contour_cache, tmp_path):
+    mp_module.set_contour_cache(maxbytes=0)
+    fresh = render('shaded', 'Robinson')
+
+    mp_module.set_contour_cache(directory=str(tmp_path))
+    render('shaded', 'Robinson')
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.npz')]) == 1
+
+    # Read back from the directory : the memory cache is cleared
+    mp_module.set_contour_cache(directory=str(tmp_path))
+    hit = render('shaded', 'Robinson')
+    assert len(mp_module._CONTOURS) == 1
+    assert np.array_equal(hit, fresh)
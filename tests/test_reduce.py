@@ -0,0 +1,74 @@
+# Reductions over time read chunk by chunk must match numpy on the whole series
+import os
+import sys
+import warnings
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mapplot as mp_module
+from mapplot import mapplot
+
+
+LON    = np.arange(  0., 360., 10.)
+LAT    = np.arange(-90., 90.+5., 10.)
+LEVELS = np.linspace(-1., 1., 11)
+NTIME  = 30
+
+
+def series():
+    rng  = np.random.default_rng(0)
+    data = rng.normal(scale=0.5, size=(NTIME, LAT.size, LON.size))
+    data[3,2,5]  = np.nan
+    data[:,4,7]  = np.nan     # No value in any time step
+    return data
+
+
+def expected(data, spec, climatology):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if (spec['op'] == 'mean'):
+            return np.nanmean(data, axis=0)
+        if (spec['op'] == 'std'):
+            return np.nanstd(data, axis=0, ddof=spec.get('ddof', 0))
+        if (spec['op'] == 'anomaly'):
+            return np.nanmean(data, axis=0) - climatology
+        return np.nanquantile(data, spec['q'], axis=0)
+
+
+@pytest.mark.parametrize('chunk', [None, 1, 7])
+@pytest.mark.parametrize('op'   , ['mean', 'std', 'std1', 'anomaly', 'quantile'])
+def test_reduce_time_matches_numpy(op, chunk):
+    data        = series()
+    climatology = np.linspace(-1., 1., LAT.size)[:,np.newaxis] * np.ones(LON.size)
+    spec        = {'op': 'std', 'ddof': 1} if (op == 'std1') else {'op': op, 'q': 0.9, 'climatology': climatology}
+    spec['chunk'] = chunk
+
+    def read(t0, t1, part):
+        return data[t0:t1, part]
+
+    result = mp_module._reduce_time(read, NTIME, data.shape[1:], mp_module._reduce_spec(spec), climatology)
+    assert np.allclose(result, expected(data, spec, climatology), equal_nan=True)
+    assert np.isnan(result[4,7])
+
+
+@pytest.mark.parametrize('op', ['mean', 'quantile'])
+def test_display_reduce_matches_numpy(op, tmp_path):
+    data = series().astype(np.float32)
+    path = os.path.join(tmp_path, 'series.dat')
+    mm   = np.memmap(path, dtype=np.float32, mode='w+', shape=data.shape)
+    mm[:] = data
+    mm.flush()
+    mm   = np.memmap(path, dtype=np.float32, mode='r', shape=data.shape)
+
+    def render(field, **kwargs):
+        mp = mapplot(None, [1,1,1], LON, LAT, lonlim=[60., 200.], latlim=[-40., 60.])
+        mp.gxout('raster')
+        mp.display(field, levels=LEVELS, **kwargs)
+        return mp.to_rgba(dpi=60)
+
+    spec = {'op': op, 'q': 0.5}
+    assert np.array_equal(render(mm, reduce=spec), render(expected(data.astype(np.float64), spec, None)))
@@ -0,0 +1,66 @@
+# render_series with skip_existing must resume an interrupted run without rendering the finished steps again
+import os
+import sys
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mapplot import render_series
+
+
+LON   = np.arange(  0., 360., 10.)
+LAT   = np.arange(-90., 90.+5., 10.)
+NTIME = 6
+
+
+def spec(directory):
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    data = np.stack([np.cos(y) * np.sin(3.*x + t) for t in range(NTIME)])
+    np.save(os.path.join(directory, 'series.npy'), data)
+    return {'input'  : os.path.join(directory, 'series.npy'),
+            'lon'    : LON.tolist(),
+            'lat'    : LAT.tolist(),
+            'mapplot': {'resolution': 'low'},
+            'gxout'  : 'shaded',
+            'display': {'levels': np.linspace(-1., 1., 11).tolist()},
+            'title'  : 'step {index}',
+            'output' : os.path.join(directory, 'out', 'map_{index:02d}.png'),
+            'savefig': {'dpi': 40},
+           }
+
+
+def outputs(directory):
+    return sorted(os.listdir(os.path.join(directory, 'out')))
+
+
+def test_render_series_skip_existing_resumes(tmp_path):
+    directory = str(tmp_path)
+    job       = spec(directory)
+
+    # Interrupted after 3 steps
+    stats = render_series(job, steps=(0, 3))
+    assert stats['frames'] == 3 and stats['skipped'] == 0
+    assert outputs(directory) == [f'map_{i:02d}.png' for i in range(3)]
+    first = os.path.join(directory, 'out', 'map_00.png')
+    mtime = os.stat(first).st_mtime_ns
+
+    stats = render_series(job, skip_existing=True)
+    assert stats['frames'] == NTIME - 3 and stats['skipped'] == 3
+    assert outputs(directory) == [f'map_{i:02d}.png' for i in range(NTIME)]
+    assert os.stat(first).st_mtime_ns == mtime
+
+    # A lost output is rendered again, and nothing else
+    os.remove(os.path.join(directory, 'out', 'map_04.png'))
+    stats = render_series(job, skip_existing=True)
+    assert stats['frames'] == 1 and stats['skipped'] == NTIME - 1
+    assert outputs(directory) == [f'map_{i:02d}.png' for i in range(NTIME)]
+
+
+def test_render_series_without_skip_renders_all(tmp_path):
+    directory = str(tmp_path)
+    job       = spec(directory)
+    render_series(job, steps=(0, 2))
+    stats = render_series(job)
+    assert stats['frames'] == NTIME and stats['skipped'] == 0
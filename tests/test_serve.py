@@ -0,0 +1,99 @@
+# A render server on a temporary Unix socket must return the same image as the rendering in this process
+import io
+import os
+import sys
+import stat
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.image as mimage
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import mapplot as mp_module
+from mapplot import render_request, render_batch
+
+
+LON = np.arange(  0., 360., 10.)
+LAT = np.arange(-90., 90.+5., 10.)
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+
+
+# Server in a subprocess : the socket path is kept short for the limit of sun_path
+@pytest.fixture
+def server():
+    directory = tempfile.mkdtemp(prefix='mp')
+    address   = os.path.join(directory, 'srv.sock')
+    process   = subprocess.Popen([sys.executable, os.path.join(ROOT, 'mapplot.py'), 'serve', '--socket', address, '--resolution', 'low'])
+    try:
+        start = time.monotonic()
+        while (not os.path.exists(address)):
+            assert process.poll() is None, 'server exited'
+            assert time.monotonic() - start < 60., 'server did not start'
+            time.sleep(0.05)
+        yield {'address': address, 'process': process, 'directory': directory}
+    finally:
+        if (process.poll() is None):
+            process.kill()
+            process.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def spec(directory):
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    np.save(os.path.join(directory, 'data.npy'), np.cos(y) * np.sin(3.*x))
+    return {'mapplot': {'lon': LON.tolist(), 'lat': LAT.tolist(), 'resolution': 'low'},
+            'gxout'  : 'shaded',
+            'display': {'data': os.path.join(directory, 'data.npy'), 'levels': np.linspace(-1., 1., 11).tolist()},
+            'cbar'   : True,
+            'title'  : 'served',
+            'savefig': {'dpi': 40},
+           }
+
+
+def shutdown(address):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(address)
+        mp_module._send_message(client, {'command': 'shutdown'})
+        return mp_module._recv_message(client)[0]
+
+
+def test_serve_render_request_roundtrip(server):
+    address = server['address']
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+
+    job = spec(server['directory'])
+    png = render_request(job, address, timeout=60.)
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+
+    # Same image as a local job : the arrays of the spec are JSON lists only for the server
+    local = dict(job, output=os.path.join(server['directory'], 'local.png'))
+    local['display'] = dict(job['display'], levels=np.asarray(job['display']['levels']))
+    assert render_batch([local], workers=1)[0]['ok']
+    assert np.array_equal(mimage.imread(io.BytesIO(png)), mimage.imread(local['output']))
+
+    bad = dict(job, gxout='bogus')
+    with pytest.raises(RuntimeError):
+        render_request(bad, address, timeout=60.)
+
+    assert shutdown(address)['ok']
+    assert server['process'].wait(30) == 0
+    assert not os.path.exists(address)
+
+
+def test_serve_keeps_non_socket_path(tmp_path):
+    path = os.path.join(tmp_path, 'not_a_socket')
+    with open(path, 'w') as f:
+        f.write('keep')
+    with pytest.raises(ValueError):
+        mp_module.serve(path)
+    with open(path) as f:
+        assert f.read() == 'keep'
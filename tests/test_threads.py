@@ -0,0 +1,81 @@
+# Maps rendered by threads must be identical to the maps rendered one by one
+import os
+import sys
+import concurrent.futures
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import cartopy.crs as ccrs
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mapplot as mp_module
+from mapplot import mapplot
+
+
+LON    = np.arange(  0., 360., 2.5)
+LAT    = np.arange(-90., 90.+1.25, 2.5)
+LEVELS = np.linspace(-1., 1., 11)
+COUNT  = 8
+
+
+# Shaded and contour maps on PlateCarree and Robinson, with labels and a colorbar
+def render(i):
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    data = np.cos(y) * np.sin(3.*x + i)
+    args = {'projection': ccrs.Robinson()} if (i % 2) else {}
+    mp   = mapplot(None, [1,1,1], LON, LAT, **args)
+    mp.gxout('shaded' if (i % 4 < 2) else 'contour')
+    mp.display(data, levels=LEVELS)
+    mp.set_label()
+    mp.set_title(f'map {i}')
+    if (i % 4 < 2):
+        mp.set_cbar()
+    return mp.to_rgba(dpi=60)
+
+
+@pytest.fixture
+def thread_rendering():
+    enabled = mp_module.set_thread_rendering()
+    yield enabled
+    mp_module.set_thread_rendering(False)
+
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_threads_match_serial(thread_rendering, workers):
+    assert thread_rendering
+    serial = [render(i) for i in range(COUNT)]
+    for repeat in range(2):
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            threaded = list(executor.map(render, range(COUNT)))
+        for i in range(COUNT):
+            assert threaded[i].shape == serial[i].shape
+            assert np.array_equal(threaded[i], serial[i]), f'map {i} differs (repeat {repeat})'
+
+
+def test_set_thread_rendering_restores_cartopy():
+    import cartopy.trace as ctrace
+    original = ctrace._interpolator
+    assert mp_module.set_thread_rendering()
+    assert mp_module.set_thread_rendering()
+    assert ctrace._interpolator is not original
+    assert not mp_module.set_thread_rendering(False)
+    assert ctrace._interpolator is original
+
+
+def test_set_thread_rendering_skips_unchecked_cartopy(monkeypatch):
+    import cartopy.trace as ctrace
+    original = ctrace._interpolator
+    monkeypatch.setattr(mp_module, '_THREAD_RENDERING_VERSIONS', ('0.0',))
+    with pytest.warns(UserWarning, match='checked with cartopy'):
+        assert not mp_module.set_thread_rendering()
+    assert ctrace._interpolator is original
+
+
+def test_set_thread_rendering_skips_missing_hook(monkeypatch):
+    import cartopy.trace as ctrace
+    monkeypatch.delattr(ctrace, '_interpolator')
+    with pytest.warns(UserWarning, match='was not found'):
+        assert not mp_module.set_thread_rendering()
+    assert not hasattr(ctrace, '_interpolator')
@@ -0,0 +1,72 @@
+# render_tiles must render only the tiles whose field has changed, and keep each version in its directory
+import os
+import sys
+import json
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import cartopy.crs as ccrs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mapplot import mapplot
+
+
+LON    = np.arange(  0., 360., 5.)
+LAT    = np.arange(-85., 85.+2.5, 5.)
+LEVELS = np.linspace(-1., 1., 11)
+ZOOMS  = range(0, 3)
+
+
+def field(shift=0.):
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    return np.cos(y) * np.sin(3.*x + shift)
+
+
+def new_mapplot():
+    mp = mapplot(None, [1,1,1], LON, LAT, projection=ccrs.Mercator.GOOGLE, latlim=[-85., 85.], coastline=False)
+    mp.gxout('shaded')
+    return mp
+
+
+def tiles(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory) for root, dirs, names in os.walk(directory) for name in names)
+
+
+def test_render_tiles_versions(tmp_path):
+    directory = str(tmp_path)
+    mp        = new_mapplot()
+    data      = field()
+
+    first = mp.render_tiles(directory, data, zooms=ZOOMS, version='v1', levels=LEVELS)
+    assert first['tiles'] == sum(4**z for z in ZOOMS)
+    assert first['rendered'] > 0 and first['unchanged'] == 0
+    written = tiles(os.path.join(directory, 'v1'))
+    assert len(written) == first['rendered']
+    assert os.path.join('0', '0', '0.png') in written
+
+    # Same field and style : nothing is rendered again
+    again = mp.render_tiles(directory, data, zooms=ZOOMS, version='v1', levels=LEVELS)
+    assert again['rendered'] == 0 and again['unchanged'] == first['rendered']
+
+    # New version of the same field : the tiles are linked or copied from the previous version
+    second = mp.render_tiles(directory, data, zooms=ZOOMS, version='v2', levels=LEVELS)
+    assert second['rendered'] == 0 and second['unchanged'] == first['rendered']
+    assert tiles(os.path.join(directory, 'v2')) == written
+    with open(os.path.join(directory, 'v1', '0', '0', '0.png'), 'rb') as f1, open(os.path.join(directory, 'v2', '0', '0', '0.png'), 'rb') as f2:
+        assert f1.read() == f2.read()
+    with open(os.path.join(directory, 'tiles.json')) as f:
+        assert json.load(f)['version'] == 'v2'
+
+    # Changed field : rendered again
+    third = mp.render_tiles(directory, field(1.), zooms=ZOOMS, version='v3', levels=LEVELS)
+    assert third['rendered'] > 0
+
+
+def test_render_tiles_style_change(tmp_path):
+    directory = str(tmp_path)
+    mp        = new_mapplot()
+    first = mp.render_tiles(directory, field(), zooms=ZOOMS, levels=LEVELS)
+    other = mp.render_tiles(directory, field(), zooms=ZOOMS, levels=np.linspace(-2., 2., 11))
+    assert other['rendered'] == first['rendered'] and other['unchanged'] == 0
+    assert os.path.isfile(os.path.join(directory, '0', '0', '0.png'))
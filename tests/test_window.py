@@ -0,0 +1,74 @@
+# Maps of a regional lonlim/latlim must be identical to the maps of the grid cropped beforehand
+import os
+import sys
+
+import numpy      as np
+import matplotlib
+matplotlib.use('Agg')
+import cartopy.crs as ccrs
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mapplot import mapplot
+
+
+LON    = np.arange(  0., 360., 2.5)
+LAT    = np.arange(-90., 90.+1.25, 2.5)
+LEVELS = np.linspace(-1., 1., 11)
+# lonlim, latlim, and the indices of the grid cropped by hand with a margin wider than the plotted area
+EXTENTS = {'inside': ([100., 160.], [  0., 50.], np.flatnonzero((LON >= 40.) & (LON <= 220.)), (LAT >= -40.) & (LAT <= 85.)),
+           'seam'  : ([-60.,  60.], [-40., 40.], np.concatenate((np.flatnonzero(LON >= 270.), np.flatnonzero(LON <= 90.))), (LAT >= -60.) & (LAT <= 60.)),
+          }
+
+
+def field():
+    x, y = np.meshgrid(np.deg2rad(LON), np.deg2rad(LAT))
+    return np.cos(y) * np.sin(3.*x) + 0.3 * np.cos(5.*y) * np.cos(2.*x)
+
+
+# Array-like recording the number of the values read by display()
+class Recorder:
+    def __init__(self, data):
+        self.data  = data
+        self.shape = data.shape
+        self.ndim  = data.ndim
+        self.dtype = data.dtype
+        self.read  = 0
+
+    def __getitem__(self, key):
+        values = np.asarray(self.data[key])
+        self.read += values.size
+        return values
+
+
+def render(lon, lat, data, method, projection, extent):
+    args = {'lonlim': EXTENTS[extent][0], 'latlim': EXTENTS[extent][1]}
+    if (projection == 'Robinson'):
+        args['projection'] = ccrs.Robinson()
+    mp = mapplot(None, [1,1,1], lon, lat, **args)
+    mp.gxout(method)
+    if (method == 'hatches'):
+        mp.display(data > 0.3)
+    else:
+        mp.display(data, levels=LEVELS)
+    return mp.to_rgba(dpi=60)
+
+
+@pytest.mark.parametrize('method'    , ['contour', 'shaded', 'raster', 'hatches'])
+@pytest.mark.parametrize('projection', ['PlateCarree', 'Robinson'])
+@pytest.mark.parametrize('extent'    , ['inside', 'seam'])
+def test_cropped_matches_full_grid(method, projection, extent):
+    cols, rows = EXTENTS[extent][2:]
+    data = field()
+    full = render(LON, LAT, data, method, projection, extent)
+    lon  = np.where(LON[cols] >= 270., LON[cols] - 360., LON[cols]) if (extent == 'seam') else LON[cols]
+    crop = render(lon, LAT[rows], data[rows][:,cols], method, projection, extent)
+    assert np.array_equal(full, crop)
+
+
+def test_regional_display_reads_window():
+    data = Recorder(field())
+    mp   = mapplot(None, [1,1,1], LON, LAT, lonlim=[100., 160.], latlim=[0., 50.])
+    mp.gxout('shaded')
+    mp.display(data, levels=LEVELS)
+    assert 0 < data.read < data.data.size // 10